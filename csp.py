@@ -1,12 +1,17 @@
 """CSP (Constraint Satisfaction Problems) problems and solvers. (Chapter 6)"""
 
+import functools
 import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
 import random
 import re
 import string
+import time
 from collections import defaultdict, Counter
 from functools import reduce
-from operator import eq, neg
+from operator import eq, neg, or_
 
 from sortedcontainers import SortedSet
 
@@ -42,6 +47,12 @@ class CSP(search.Problem):
                                 conflict with var=val
         curr_domains[var]       Slot: remaining consistent values for var
                                 Used by constraint propagation routines.
+        compile_constraints()   Tabulate the constraints in allowed, for
+                                the revise, partition and forward_check hooks
+        allowed[(A, B)][a]      Slot: the set of values b of B consistent
+                                with A=a, once compiled
+        weights[(A, B)]         Slot: how many times the constraint between
+                                A and B has wiped out a domain, for dom_wdeg
     The following methods are used only by graph_search and tree_search:
         actions(state)          Return a list of actions
         result(state, action)   Return a successor of state
@@ -60,6 +71,8 @@ class CSP(search.Problem):
         self.neighbors = neighbors
         self.constraints = constraints
         self.curr_domains = None
+        self.allowed = None
+        self.weights = Counter()
         self.nassigns = 0
 
     def assign(self, var, val, assignment):
@@ -149,6 +162,88 @@ class CSP(search.Problem):
         for B, b in removals:
             self.curr_domains[B].append(b)
 
+    def removed_values(self, removals):
+        """The (var, value) pairs of the values taken out in removals."""
+        return removals
+
+    def revise(self, Xi, Xj, removals, checks=0):
+        """Used by AC3; subclasses may implement this more efficiently.
+        Once the constraints are compiled, a value of Xi keeps its place if
+        its set in allowed meets the domain of Xj, one check per value."""
+        if self.allowed is None:
+            return revise(self, Xi, Xj, removals, checks)
+        allowed, Dj = self.allowed[Xi, Xj], self.curr_domains[Xj]
+        checks += len(self.curr_domains[Xi])
+        unsupported = [x for x in self.curr_domains[Xi] if allowed[x].isdisjoint(Dj)]
+        for x in unsupported:
+            self.prune(Xi, x, removals)
+        return bool(unsupported), checks
+
+    def partition(self, Xi, Xj, checks=0):
+        """Used by AC3b; subclasses may implement this more efficiently.
+        Once the constraints are compiled, the values of Xi with a support in
+        Xj are found as in revise, and then the values of Xj with a support
+        among those, so no value of Xj is left unknown."""
+        if self.allowed is None:
+            return partition(self, Xi, Xj, checks)
+        Di, Dj = self.curr_domains[Xi], self.curr_domains[Xj]
+        allowed = self.allowed[Xi, Xj]
+        Si_p = {x for x in Di if not allowed[x].isdisjoint(Dj)}
+        allowed = self.allowed[Xj, Xi]
+        Sj_p = {y for y in Dj if not allowed[y].isdisjoint(Si_p)}
+        return Si_p, Sj_p, set(), checks + len(Di) + len(Dj)
+
+    def forward_check(self, var, value, assignment, removals):
+        """Used by forward_checking; subclasses may implement this more
+        efficiently. Prune neighbor values inconsistent with var=value."""
+        for B in self.neighbors[var]:
+            if B not in assignment:
+                if self.allowed is None:
+                    for b in self.curr_domains[B][:]:
+                        if not self.constraints(var, value, B, b):
+                            self.prune(B, b, removals)
+                else:
+                    allowed = self.allowed[var, B][value]
+                    for b in [b for b in self.curr_domains[B] if b not in allowed]:
+                        self.prune(B, b, removals)
+                if not self.curr_domains[B]:
+                    return False
+        return True
+
+    def compile_constraints(self):
+        """Evaluate the constraints once for every pair of values on every arc,
+        and keep, per arc and value, the set of consistent neighbor values.
+        The revise, partition and forward_check hooks (so AC3, AC3b, mac and
+        forward_checking) then test these sets against whole domains, and AC4
+        takes all the supports of a value at once, one check per value rather
+        than per pair of values; nconflicts still calls constraints. Leaving
+        out the compilation, this about halves AC3 and AC4 on Zebra, whose
+        constraints are slow, and cuts AC3b on NQueensCSP(30) to a third. On
+        Sudoku and map coloring the times stay about the same, as there the
+        constraint is a single comparison that usually holds at once.
+        >>> plain, compiled = Sudoku(easy1), Sudoku(easy1)
+        >>> compiled.compile_constraints()
+        >>> '1' in compiled.allowed[0, 1]['1'], '2' in compiled.allowed[0, 1]['1']
+        (False, True)
+        >>> AC3(plain)[0], AC3(compiled)[0], plain.curr_domains == compiled.curr_domains
+        (True, True, True)
+        >>> plain, compiled = Zebra(), Zebra()
+        >>> compiled.compile_constraints()
+        >>> AC4(plain)[0], AC4(compiled)[0], plain.curr_domains == compiled.curr_domains
+        (True, True, True)
+        """
+        if self.allowed is not None:
+            return
+        interned = {}  # e.g. for Sudoku many arcs share the same sets
+        self.allowed = {}
+        for Xi in self.variables:
+            for Xj in self.neighbors[Xi]:
+                table = self.allowed[Xi, Xj] = {}
+                for x in self.domains[Xi]:
+                    consistent = frozenset(y for y in self.domains[Xj]
+                                           if self.constraints(Xi, x, Xj, y))
+                    table[x] = interned.setdefault(consistent, consistent)
+
     # This is for min_conflicts search
 
     def conflicted_vars(self, current):
@@ -157,6 +252,238 @@ class CSP(search.Problem):
                 if self.nconflicts(var, current[var], current) > 0]
 
 
+class BitsetCSP(CSP):
+    """A CSP that keeps its current domains as integer bitmasks: bit i is
+    set while the i-th value of domains[var] is still possible. Each entry
+    of curr_domains is a BitsetDomain holding such a mask, which acts like
+    the list of values left, so code written for list domains (AC3,
+    forward_checking, mac, ...) runs unchanged; prune and suppose clear
+    bits in it, and iterating over a domain while pruning it needs no copy.
+    The removals returned by suppose are a trail of (var, removed bits)
+    entries, so restore just ors the bits back in. The revise, partition and
+    forward_check hooks, which AC3, AC3b and forward_checking call, work on
+    a whole domain at a time here, by anding with the masks from
+    arc_supports. Put this class before another CSP class to
+    give it bitset domains, as BitsetSudoku and BitsetNQueensCSP do."""
+
+    def support_pruning(self):
+        """Set up the value indices and domains, the first time they are needed."""
+        if self.curr_domains is None:
+            indices = {}  # shared by variables with the same domain
+            self.curr_domains, self.supports, self.domain_supports = {}, {}, {}
+            for v in self.variables:
+                values = tuple(self.domains[v])
+                if values not in indices:
+                    indices[values] = {val: 1 << i for i, val in enumerate(values)}
+                self.curr_domains[v] = BitsetDomain(values, indices[values], (1 << len(values)) - 1)
+
+    def set_mask(self, var, mask):
+        """Narrow (or, when restoring, widen) the domain of var to mask."""
+        domain = self.curr_domains[var]
+        domain.mask, domain.size = mask, bin(mask).count('1')
+
+    def suppose(self, var, value):
+        """Start accumulating inferences from assuming var=value."""
+        self.support_pruning()
+        mask = self.curr_domains[var].mask
+        bit = self.curr_domains[var].bits[value]
+        self.set_mask(var, bit)
+        return [(var, mask & ~bit)]
+
+    def prune(self, var, value, removals):
+        """Rule out var=value."""
+        domain = self.curr_domains[var]
+        bit = domain.bits[value]
+        domain.mask, domain.size = domain.mask & ~bit, domain.size - 1
+        if removals is not None:
+            removals.append((var, bit))
+
+    def infer_assignment(self):
+        """Return the partial assignment implied by the current inferences."""
+        self.support_pruning()
+        return {v: d[0] for v, d in self.curr_domains.items() if len(d) == 1}
+
+    def restore(self, removals):
+        """Undo a supposition and all inferences from it."""
+        for var, bits in removals:
+            self.set_mask(var, self.curr_domains[var].mask | bits)
+
+    def removed_values(self, removals):
+        """The (var, value) pairs of the values taken out in removals."""
+        for var, bits in removals:
+            domain = self.curr_domains[var]
+            for value in BitsetDomain(domain.values, domain.bits, bits, domain.chunks):
+                yield var, value
+
+    def arc_supports(self, Xi, Xj):
+        """A list whose i-th entry has the bits of the values of Xj that are
+        consistent with Xi taking its i-th value; computed once per arc."""
+        supports = self.supports.get((Xi, Xj))
+        if supports is None:
+            Di, Dj = self.curr_domains[Xi], self.curr_domains[Xj]
+            everything = (1 << len(Dj.values)) - 1
+            if self.constraints is different_values_constraint:
+                # these depend only on the two domains, which many arcs share
+                supports = self.domain_supports.get((Di.values, Dj.values))
+                if supports is None:
+                    supports = self.domain_supports[Di.values, Dj.values] = [
+                        everything & ~Dj.bits.get(x, 0) for x in Di.values]
+            else:
+                supports = [sum(bit for y, bit in Dj.bits.items() if self.constraints(Xi, x, Xj, y))
+                            for x in Di.values]
+            self.supports[Xi, Xj] = supports
+        return supports
+
+    def compile_constraints(self):
+        """Compute the supports of every arc now rather than on first use."""
+        self.support_pruning()
+        for Xi in self.variables:
+            for Xj in self.neighbors[Xi]:
+                self.arc_supports(Xi, Xj)
+
+    def supported(self, Xi, Xj, checks=0):
+        """Return a mask of the values of Xi that have a support left in Xj,
+        a mask of the values of Xj that support them, and checks. Whichever
+        domain is smaller is walked, one check per value; as constraints are
+        symmetric, walking Xj gives the same masks the other way round."""
+        Di, Dj = self.curr_domains[Xi], self.curr_domains[Xj]
+        flipped = Dj.size < Di.size
+        if flipped:
+            Xi, Xj, Di, Dj = Xj, Xi, Dj, Di
+        supports = self.supports.get((Xi, Xj)) or self.arc_supports(Xi, Xj)
+        other, rest = Dj.mask, Di.mask
+        with_support = supported = 0
+        while rest:
+            low = rest & -rest
+            rest ^= low
+            checks += 1
+            support = supports[low.bit_length() - 1] & other
+            if support:
+                with_support |= low
+                supported |= support
+        if flipped:
+            return supported, with_support, checks
+        return with_support, supported, checks
+
+    def revise(self, Xi, Xj, removals, checks=0):
+        """Remove the values of Xi that have no support left in Xj; return
+        (whether any were removed, checks). This is supported, written out
+        for speed, since AC3 calls it so often."""
+        Di, Dj = self.curr_domains[Xi], self.curr_domains[Xj]
+        old = Di.mask
+        if Dj.size < Di.size:
+            supports = self.supports.get((Xj, Xi)) or self.arc_supports(Xj, Xi)
+            keep, rest = 0, Dj.mask
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                checks += 1
+                keep |= supports[low.bit_length() - 1]
+            keep &= old
+        else:
+            supports = self.supports.get((Xi, Xj)) or self.arc_supports(Xi, Xj)
+            keep = rest = old
+            other = Dj.mask
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                checks += 1
+                if not supports[low.bit_length() - 1] & other:
+                    keep ^= low
+        if keep == old:
+            return False, checks
+        self.set_mask(Xi, keep)
+        if removals is not None:
+            removals.append((Xi, old & ~keep))
+        return True, checks
+
+    def partition(self, Xi, Xj, checks=0):
+        """The sets AC3b's partition returns: the values of Xi supported in
+        Xj and the values of Xj supporting them. The masks give every support
+        at once, so no value of Xj is left unknown and the third set is empty."""
+        with_support, supported, checks = self.supported(Xi, Xj, checks)
+        Di, Dj = self.curr_domains[Xi], self.curr_domains[Xj]
+        return (set(BitsetDomain(Di.values, Di.bits, with_support, Di.chunks)),
+                set(BitsetDomain(Dj.values, Dj.bits, supported, Dj.chunks)), set(), checks)
+
+    def forward_check(self, var, value, assignment, removals):
+        """Prune neighbor values inconsistent with var=value, by anding each
+        neighbor's mask with the supports of value."""
+        i = self.curr_domains[var].bits[value].bit_length() - 1
+        for B in self.neighbors[var]:
+            if B not in assignment:
+                domain = self.curr_domains[B]
+                old = domain.mask
+                new = old & (self.supports.get((var, B)) or self.arc_supports(var, B))[i]
+                if new != old:
+                    domain.mask, domain.size = new, bin(new).count('1')
+                    if removals is not None:
+                        removals.append((B, old & ~new))
+                if not new:
+                    return False
+        return True
+
+
+class BitsetDomain:
+    """The values of a domain whose bits are set in mask, in domain order.
+    Iterating goes over the values present when the iteration began, and
+    [:] gives a copy that later pruning does not change. Iteration looks
+    the mask up a byte at a time in chunks (see bitset_chunks), which
+    domains over the same values share."""
+
+    __slots__ = ('values', 'bits', 'mask', 'size', 'chunks')
+
+    def __init__(self, values, bits, mask, chunks=None):
+        self.values, self.bits, self.mask = values, bits, mask
+        self.size = bin(mask).count('1')
+        self.chunks = chunks or bitset_chunks(values)
+
+    def __iter__(self):
+        mask, present = self.mask, []
+        for chunk in self.chunks:
+            if not mask:
+                break
+            present.extend(chunk[mask & 255])
+            mask >>= 8
+        return iter(present)
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __contains__(self, value):
+        return bool(self.bits.get(value, 0) & self.mask)
+
+    def __getitem__(self, key):
+        if key == slice(None):
+            return BitsetDomain(self.values, self.bits, self.mask, self.chunks)
+        if key == 0 and self.mask:
+            return self.values[(self.mask & -self.mask).bit_length() - 1]
+        return list(self)[key]
+
+    def __eq__(self, other):
+        if isinstance(other, (BitsetDomain, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+@functools.lru_cache(maxsize=None)
+def bitset_chunks(values):
+    """For each byte k of a mask over values, a table whose entry b is the
+    tuple of the values whose bits are set in b, when b is byte k.
+    >>> bitset_chunks(tuple('abcdefghij'))[1][0b10]
+    ('j',)
+    """
+    return [tuple(tuple(values[i] for i in range(k, min(k + 8, len(values))) if b >> (i - k) & 1)
+                  for b in range(256))
+            for k in range(0, len(values), 8)]
+
+
 # ______________________________________________________________________________
 # Constraint Propagation with AC3
 
@@ -178,7 +505,7 @@ def AC3(csp, queue=None, removals=None, arc_heuristic=dom_j_up):
     checks = 0
     while queue:
         (Xi, Xj) = queue.pop()
-        revised, checks = revise(csp, Xi, Xj, removals, checks)
+        revised, checks = csp.revise(Xi, Xj, removals, checks)
         if revised:
             if not csp.curr_domains[Xi]:
                 return False, checks  # CSP is inconsistent
@@ -221,7 +548,7 @@ def AC3b(csp, queue=None, removals=None, arc_heuristic=dom_j_up):
         # Si_p values are all known to be supported by Xj
         # Sj_p values are all known to be supported by Xi
         # Dj - Sj_p = Sj_u values are unknown, as yet, to be supported by Xi
-        Si_p, Sj_p, Sj_u, checks = partition(csp, Xi, Xj, checks)
+        Si_p, Sj_p, Sj_u, checks = csp.partition(Xi, Xj, checks)
         if not Si_p:
             return False, checks  # CSP is inconsistent
         revised = False
@@ -308,11 +635,16 @@ def AC4(csp, queue=None, removals=None, arc_heuristic=dom_j_up):
         (Xi, Xj) = queue.pop()
         revised = False
         for x in csp.curr_domains[Xi][:]:
-            for y in csp.curr_domains[Xj]:
-                if csp.constraints(Xi, x, Xj, y):
-                    support_counter[(Xi, x, Xj)] += 1
-                    variable_value_pairs_supported[(Xj, y)].add((Xi, x))
+            if csp.allowed is None:
+                supports = [y for y in csp.curr_domains[Xj] if csp.constraints(Xi, x, Xj, y)]
+                checks += len(csp.curr_domains[Xj])
+            else:
+                # compiled constraints: all the supports of x at once
+                supports = csp.allowed[Xi, Xj][x].intersection(csp.curr_domains[Xj])
                 checks += 1
+            for y in supports:
+                variable_value_pairs_supported[(Xj, y)].add((Xi, x))
+            support_counter[(Xi, x, Xj)] += len(supports)
             if support_counter[(Xi, x, Xj)] == 0:
                 csp.prune(Xi, x, removals)
                 revised = True
@@ -361,6 +693,21 @@ def num_legal_values(csp, var, assignment):
         return count(csp.nconflicts(var, val, assignment) == 0 for val in csp.domains[var])
 
 
+def dom_wdeg(assignment, csp):
+    """Domain over weighted degree heuristic: the variable with the fewest legal
+    values per unit of weight of its constraints with unassigned variables,
+    where a constraint weighs one more than the number of domains it has wiped
+    out (csp.weights, kept up by backjumping_search). So the search learns to
+    start with the variables that are hard to satisfy."""
+
+    def ratio(var):
+        wdeg = sum(1 + csp.weights[var, B] for B in csp.neighbors[var]
+                   if B != var and B not in assignment)
+        return num_legal_values(csp, var, assignment) / wdeg if wdeg else float('inf')
+
+    return argmin_random_tie([v for v in csp.variables if v not in assignment], key=ratio)
+
+
 # Value ordering
 
 
@@ -384,14 +731,7 @@ def no_inference(csp, var, value, assignment, removals):
 def forward_checking(csp, var, value, assignment, removals):
     """Prune neighbor values inconsistent with var=value."""
     csp.support_pruning()
-    for B in csp.neighbors[var]:
-        if B not in assignment:
-            for b in csp.curr_domains[B][:]:
-                if not csp.constraints(var, value, B, b):
-                    csp.prune(B, b, removals)
-            if not csp.curr_domains[B]:
-                return False
-    return True
+    return csp.forward_check(var, value, assignment, removals)
 
 
 def mac(csp, var, value, assignment, removals, constraint_propagation=AC3b):
@@ -427,6 +767,293 @@ def backtracking_search(csp, select_unassigned_variable=first_unassigned_variabl
     return result
 
 
+# Conflict-directed backjumping, with nogood learning and restarts
+
+
+class NogoodStore:
+    """Learned nogoods: frozensets of (var, value) pairs that no solution has
+    all of, indexed by pair. It holds at most limit nogoods, forgetting the
+    one least recently added or used when it is full."""
+
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.nogoods = {}  # nogood: None, from the least to the most recently used
+        self.index = defaultdict(set)  # (var, value): the nogoods with that pair
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def add(self, nogood):
+        if not self.limit or nogood in self.nogoods:
+            return
+        self.nogoods[nogood] = None
+        for pair in nogood:
+            self.index[pair].add(nogood)
+        if len(self.nogoods) > self.limit:
+            self.remove(next(iter(self.nogoods)))
+
+    def remove(self, nogood):
+        del self.nogoods[nogood]
+        for pair in nogood:
+            self.index[pair].discard(nogood)
+            if not self.index[pair]:
+                del self.index[pair]
+
+    def touch(self, nogood):
+        """Note that nogood has been used, so it is the last to be forgotten."""
+        self.nogoods[nogood] = self.nogoods.pop(nogood)
+
+    def containing(self, var, value):
+        return self.index.get((var, value), ())
+
+
+def backjumping_search(csp, select_unassigned_variable=dom_wdeg,
+                       order_domain_values=unordered_domain_values, nogoods=1000,
+                       restart_after=None):
+    """Backtracking search with forward checking and conflict-directed
+    backjumping (FC-CBJ) [Section 6.3.3]. Every value pruned from a domain
+    keeps the set of assigned variables that ruled it out. When a variable
+    runs out of values, the variables to blame are those that pruned its
+    values, plus those blamed for the failure of each value it tried; the
+    search jumps straight back to the most recent of them, skipping the
+    variables in between, which had nothing to do with the failure.
+    The assignment of the variables to blame is a nogood: up to nogoods of
+    them are kept in a NogoodStore, and whenever all but one pair of a nogood
+    holds, the value in the last pair is pruned, so the search never walks
+    into the same failure twice. Every wiped-out domain also adds one to the
+    weight of the constraint that wiped it out (csp.weights), which dom_wdeg
+    uses to pick variables. With restart_after, the search starts again from
+    scratch after that many failed variables, each time allowing 1.5 times
+    as many; what it has learned, the nogoods and weights, carries over.
+    Forward checking is built in, so there is no inference argument.
+    >>> backjumping_search(australia_csp) is not None
+    True
+    >>> backjumping_search(MapColoringCSP('RG', australia_csp.neighbors)) is None
+    True
+    >>> len(backjumping_search(NQueensCSP(8), restart_after=10))
+    8
+    >>> backjumping_search(BitsetSudoku(harder1)) is not None
+    True
+    """
+    csp.support_pruning()
+    store = NogoodStore(nogoods)
+    reasons = {var: {} for var in csp.variables}  # pruned value: the variables that ruled it out
+    assignment, stack, conflicts = {}, [], {}
+    failures, limit = 0, restart_after
+
+    def prune(B, b, because, removals):
+        csp.prune(B, b, removals)
+        reasons[B][b] = because
+
+    def blame(B):
+        """The variables responsible for the values of B that are gone."""
+        return set().union(*reasons[B].values())
+
+    def propagate(var, value, removals):
+        """Forward check var=value and apply the nogoods it takes to their last
+        pair. Return None, or, if a variable has no values left, the set of
+        variables to blame for it."""
+        for B in csp.neighbors[var]:
+            if B != var and B not in assignment:
+                for b in csp.curr_domains[B][:]:
+                    if not csp.constraints(var, value, B, b):
+                        prune(B, b, {var}, removals)
+                if not csp.curr_domains[B]:
+                    csp.weights[var, B] += 1
+                    csp.weights[B, var] += 1
+                    return blame(B)
+        for nogood in list(store.containing(var, value)):
+            unassigned = [(B, b) for (B, b) in nogood if B not in assignment]
+            if (any(assignment[B] != b for (B, b) in nogood if B in assignment)
+                    or len(unassigned) > 1):
+                continue
+            store.touch(nogood)
+            if not unassigned:
+                return {B for (B, b) in nogood}
+            (B, b), = unassigned
+            if b in csp.curr_domains[B]:
+                prune(B, b, {A for (A, a) in nogood if A != B}, removals)
+                if not csp.curr_domains[B]:
+                    return blame(B)
+        return None
+
+    def undo(var, removals):
+        for B, b in csp.removed_values(removals):
+            reasons[B].pop(b, None)
+        csp.restore(removals)
+        csp.unassign(var, assignment)
+
+    def push():
+        var = select_unassigned_variable(assignment, csp)
+        conflicts[var] = set()
+        # [variable, values left to try (last first), removals for its value]
+        stack.append([var, list(order_domain_values(var, assignment, csp))[::-1], None])
+
+    if not csp.variables:
+        return {}
+    push()
+    while True:
+        frame = stack[-1]
+        var, values = frame[0], frame[1]
+        if frame[2] is not None:
+            undo(var, frame[2])
+            frame[2] = None
+        while values:
+            value = values.pop()
+            csp.assign(var, value, assignment)
+            removals = csp.suppose(var, value)
+            culprits = propagate(var, value, removals)
+            if culprits is None:
+                frame[2] = removals
+                break
+            conflicts[var] |= culprits - {var}
+            undo(var, removals)
+        else:
+            # all the values of var failed: jump back to the last variable to blame
+            culprits = conflicts.pop(var) | blame(var)
+            stack.pop()
+            if not culprits:
+                return None  # there is no solution
+            store.add(frozenset((B, assignment[B]) for B in culprits))
+            while stack[-1][0] not in culprits:
+                B, _, removals = stack.pop()
+                undo(B, removals)
+                del conflicts[B]
+            conflicts[stack[-1][0]] |= culprits - {stack[-1][0]}
+            failures += 1
+            if limit and failures >= limit:
+                while stack:
+                    B, _, removals = stack.pop()
+                    undo(B, removals)
+                conflicts.clear()
+                failures, limit = 0, limit * 1.5
+                push()
+            continue
+        if len(assignment) == len(csp.variables):
+            return assignment
+        push()
+
+
+# Racing several configurations of the search against each other
+
+portfolio_configurations = [
+    dict(select_unassigned_variable=mrv, inference=forward_checking),
+    dict(select_unassigned_variable=mrv, order_domain_values=lcv, inference=forward_checking),
+    dict(select_unassigned_variable=mrv, inference=mac),
+    dict(select_unassigned_variable=mrv,
+         inference=functools.partial(mac, constraint_propagation=AC3)),
+    dict(select_unassigned_variable=mrv,
+         inference=functools.partial(mac, constraint_propagation=AC4)),
+    dict(select_unassigned_variable=first_unassigned_variable, inference=forward_checking)
+]
+
+
+def configuration_name(configuration):
+    """A readable name for a dict of backtracking_search keyword arguments,
+    such as 'inference=mac(constraint_propagation=AC3), select_unassigned_variable=mrv'.
+    >>> configuration_name(dict(inference=forward_checking)), configuration_name({})
+    ('inference=forward_checking', 'default')
+    """
+
+    def name(f):
+        if isinstance(f, functools.partial):
+            return '{}({})'.format(name(f.func), ', '.join('{}={}'.format(k, name(v))
+                                                           for k, v in sorted(f.keywords.items())))
+        return getattr(f, '__name__', repr(f))
+
+    return (', '.join('{}={}'.format(k, name(v)) for k, v in sorted(configuration.items()))
+            or 'default')
+
+
+def portfolio_run(csp, configuration, seed, conn):
+    """Run backtracking_search(csp, **configuration) for portfolio_search, with
+    random (which breaks ties in mrv) seeded with seed, and send the result,
+    time taken and number of assignments made down conn."""
+    random.seed(seed)
+    start = time.perf_counter()
+    try:
+        result = backtracking_search(csp, **configuration)
+        status = 'solved' if result is not None else 'unsatisfiable'
+    except Exception as e:
+        result, status = None, 'error: {!r}'.format(e)
+    conn.send(dict(result=result, status=status, seconds=time.perf_counter() - start,
+                   nassigns=csp.nassigns))
+    conn.close()
+
+
+def portfolio_search(csp, configurations=portfolio_configurations, seed=None, timeout=None,
+                     problem_class=None, log_file=None, display=False):
+    """Race backtracking searches on csp, one process per configuration (a dict
+    of keyword arguments for backtracking_search), and return the answer of
+    the first to finish, terminating the others. As each is a complete
+    search, that answer is final: a solution, or None if there is none. The
+    same configuration may be listed more than once, since each process
+    gets a seed of its own, drawn from seed, for the random tie-breaking of
+    mrv. Gives up, returning None, after timeout seconds if one is given.
+    Also returns a record of the race: its status ('solved', 'unsatisfiable',
+    'timeout', or 'failed' if every search raised an exception), the
+    winning configuration's name and position in configurations, its seed,
+    time and number of assignments, and the names of all the configurations.
+    The record is labelled with problem_class (by default, the class name of
+    csp), so that a log of races can tell which configurations do well on
+    which kind of problem; the record is appended to log_file, as a line of
+    JSON, if log_file is given, and printed if display is true. The csp
+    itself is left as it was: the searches run on copies of it in the other
+    processes. (Where processes are spawned rather than forked, csp and the
+    configurations must be picklable.)"""
+    rng = random.Random(seed)
+    record = dict(problem_class=problem_class or type(csp).__name__,
+                  configurations=[configuration_name(c) for c in configurations],
+                  status='failed', winner=None, index=None, seed=None, seconds=None, nassigns=None)
+    result = None
+    start = time.monotonic()
+    running = {}  # connection -> (configuration number, seed, process)
+    for i, configuration in enumerate(configurations):
+        s = rng.randrange(2 ** 32)
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=portfolio_run,
+                                          args=(csp, configuration, s, sender))
+        process.start()
+        sender.close()
+        running[receiver] = (i, s, process)
+    try:
+        while running and record['winner'] is None:
+            wait = None if timeout is None else max(0, start + timeout - time.monotonic())
+            ready = multiprocessing.connection.wait(list(running), wait)
+            if not ready:
+                record['status'] = 'timeout'
+                break
+            for conn in ready:
+                i, s, process = running.pop(conn)
+                try:
+                    answer = conn.recv()
+                except EOFError:
+                    continue  # the process died
+                finally:
+                    process.join()
+                if answer['status'] in ('solved', 'unsatisfiable'):
+                    result = answer['result']
+                    record.update(status=answer['status'], winner=record['configurations'][i],
+                                  index=i, seed=s, seconds=answer['seconds'],
+                                  nassigns=answer['nassigns'])
+                    break
+    finally:
+        for conn, (i, s, process) in running.items():
+            process.terminate()
+            process.join()
+            conn.close()
+    if log_file:
+        with open(log_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    if display:
+        if record['winner'] is None:
+            print(record['problem_class'], record['status'])
+        else:
+            print(record['problem_class'], record['status'], 'by', record['winner'], 'in',
+                  round(record['seconds'], 4), 'seconds with', record['nassigns'], 'assignments')
+    return result, record
+
+
 # ______________________________________________________________________________
 # Min-conflicts Hill Climbing search for CSPs
 
@@ -439,13 +1066,13 @@ def min_conflicts(csp, max_steps=100000):
         val = min_conflicts_value(csp, var, current)
         csp.assign(var, val, current)
     # Now repeatedly choose a random conflicted variable and change it
+    conflicted = ConflictCounts(csp, current)
     for i in range(max_steps):
-        conflicted = csp.conflicted_vars(current)
         if not conflicted:
             return current
-        var = random.choice(conflicted)
+        var = conflicted.sample()
         val = min_conflicts_value(csp, var, current)
-        csp.assign(var, val, current)
+        conflicted.assign(var, val)
     return None
 
 
@@ -455,6 +1082,70 @@ def min_conflicts_value(csp, var, current):
     return argmin_random_tie(csp.domains[var], key=lambda val: csp.nconflicts(var, val, current))
 
 
+class ConflictCounts:
+    """The number of conflicts of each variable of a binary CSP under a complete
+    assignment, and the set of variables that have any, kept up to date as
+    variables are reassigned through assign. A reassignment only rechecks the
+    constraints between the variable and its neighbors, instead of every
+    constraint, as conflicted_vars does. The conflicted variables are kept in
+    a list, with the position of each in a dict, so that adding, removing and
+    sampling one at random are all O(1). The counts start from csp.nconflicts,
+    which must count the neighbors whose constraint with the variable fails.
+    >>> csp = MapColoringCSP('RG', 'A: B C; B: C')
+    >>> conflicted = ConflictCounts(csp, {'A': 'R', 'B': 'G', 'C': 'R'})
+    >>> conflicted.counts, len(conflicted)
+    ({'A': 1, 'B': 0, 'C': 1}, 2)
+    >>> conflicted.assign('C', 'G')
+    >>> conflicted.counts, len(conflicted)
+    ({'A': 0, 'B': 1, 'C': 1}, 2)
+    """
+
+    def __init__(self, csp, assignment):
+        self.csp = csp
+        self.assignment = assignment
+        self.counts = {var: csp.nconflicts(var, assignment[var], assignment)
+                       for var in csp.variables}
+        self.conflicted = [var for var in csp.variables if self.counts[var]]
+        self.positions = {var: i for i, var in enumerate(self.conflicted)}
+
+    def __len__(self):
+        return len(self.conflicted)
+
+    def sample(self):
+        """A conflicted variable, chosen at random."""
+        return random.choice(self.conflicted)
+
+    def assign(self, var, val):
+        """Make var=val in the assignment (through csp.assign), and update the
+        counts of var and of the neighbors whose constraint with it changed."""
+        csp, assignment = self.csp, self.assignment
+        old = assignment[var]
+        csp.assign(var, val, assignment)
+        if val == old:
+            return
+        for B in csp.neighbors[var]:
+            if B != var and B in assignment:
+                b = assignment[B]
+                delta = ((not csp.constraints(var, val, B, b))
+                         - (not csp.constraints(var, old, B, b)))
+                if delta:
+                    self.add(B, delta)
+                    self.add(var, delta)
+
+    def add(self, var, delta):
+        """Change the count of var by delta, moving it in or out of the conflicted list."""
+        count = self.counts[var] = self.counts[var] + delta
+        if count == 0:
+            # fill the hole with the last one
+            i, last = self.positions.pop(var), self.conflicted.pop()
+            if last != var:
+                self.conflicted[i] = last
+                self.positions[last] = i
+        elif count == delta:
+            self.positions[var] = len(self.conflicted)
+            self.conflicted.append(var)
+
+
 # ______________________________________________________________________________
 
 
@@ -645,9 +1336,9 @@ class NQueensCSP(CSP):
                      such that their (x, y) coordinates have x-y+n-1 = i
     We increment/decrement these counts each time a queen is placed/moved from
     a row/diagonal. So moving is O(1), as is nconflicts.  But choosing
-    a variable, and a best value for the variable, are each O(n).
-    If you want, you can keep track of conflicted variables, then variable
-    selection will also be O(1).
+    a best value for a variable is O(n), and so is updating the conflict
+    counts that min_conflicts keeps (see ConflictCounts) after a move,
+    which is what makes choosing a conflicted variable O(1).
     >>> len(backtracking_search(NQueensCSP(8)))
     8
     """
@@ -715,6 +1406,28 @@ class NQueensCSP(CSP):
             print()
 
 
+class BitsetNQueensCSP(BitsetCSP, NQueensCSP):
+    """NQueensCSP with bitset domains. The supports of an arc depend only on
+    how many columns apart its queens are, so they are remembered per
+    distance: n^2 masks rather than n^3.
+    >>> len(backtracking_search(BitsetNQueensCSP(8), inference=forward_checking))
+    8
+    """
+
+    def arc_supports(self, Xi, Xj):
+        """For each row x, all rows but x and the two that a queen in column Xi,
+        row x attacks diagonally in column Xj."""
+        d = abs(Xj - Xi)
+        supports = self.supports.get(d)
+        if supports is None:
+            n = len(self.variables)
+            everything = (1 << n) - 1
+            attacked = [1 << x | 1 << (x + d) | (1 << (x - d) if x >= d else 0) for x in range(n)]
+            supports = self.supports[d] = [everything if d == 0 else everything & ~attacked[x]
+                                           for x in range(n)]
+        return supports
+
+
 # ______________________________________________________________________________
 # Sudoku
 
@@ -809,6 +1522,207 @@ class Sudoku(CSP):
                 abut, map(show_box, brow))) for brow in self.bgrid))
 
 
+class BitsetSudoku(BitsetCSP, Sudoku):
+    """Sudoku with bitset domains.
+    >>> h = BitsetSudoku(harder1)
+    >>> backtracking_search(h, select_unassigned_variable=mrv, inference=forward_checking) is not None
+    True
+    """
+
+
+# ______________________________________________________________________________
+# Sudoku as an exact cover problem
+
+
+class ExactCover:
+    """An exact cover problem: choose rows so that every column is covered by
+    exactly one of them. columns is a dict {column: set of rows covering it};
+    rows is a dict {row: list of the columns it covers}. Solved by Knuth's
+    Algorithm X, with sets in place of dancing links: covering a row takes
+    its columns out of columns, and every row that clashes with it out of
+    the sets of the remaining columns; uncovering puts them all back.
+    >>> ExactCover.from_rows({'A': [1, 4], 'B': [2, 3], 'C': [1], 'D': [3, 4]}).count()
+    1
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def from_rows(cls, rows):
+        """The problem with these rows, and the columns they mention."""
+        columns = defaultdict(set)
+        for row, cols in rows.items():
+            for col in cols:
+                columns[col].add(row)
+        return cls(dict(columns), rows)
+
+    def cover(self, row):
+        """Choose row; return the sets of the columns it covers, for uncover."""
+        columns, rows = self.columns, self.rows
+        removed = []
+        for col in rows[row]:
+            for other in columns[col]:
+                for other_col in rows[other]:
+                    if other_col != col:
+                        columns[other_col].remove(other)
+            removed.append(columns.pop(col))
+        return removed
+
+    def uncover(self, row, removed):
+        """Undo cover(row), which returned removed."""
+        columns, rows = self.columns, self.rows
+        for col in reversed(rows[row]):
+            columns[col] = removed.pop()
+            for other in columns[col]:
+                for other_col in rows[other]:
+                    if other_col != col:
+                        columns[other_col].add(other)
+
+    def solutions(self):
+        """Generate the solutions, each a list of rows. At each step the column
+        with the fewest rows left is the one to cover. The search keeps its own
+        stack rather than recursing, as it may go one level per cell of a big
+        grid; the columns are as they were when the generator is finished."""
+        columns = self.columns
+        solution, stack = [], []
+        while True:
+            if not columns:
+                yield list(solution)
+            else:
+                # the same as min(columns, key=lambda c: len(columns[c])), but
+                # with no Python call per column, where most of the time would go
+                sizes = list(map(len, columns.values()))
+                col = next(itertools.islice(columns, sizes.index(min(sizes)), None))
+                stack.append([iter(list(columns[col])), None])
+            while stack:
+                frame = stack[-1]
+                if frame[1] is not None:
+                    self.uncover(solution.pop(), frame[1])
+                    frame[1] = None
+                row = next(frame[0], None)
+                if row is not None:
+                    frame[1] = self.cover(row)
+                    solution.append(row)
+                    break
+                stack.pop()
+            else:
+                return
+
+    def count(self, limit=None):
+        """The number of solutions, counting no further than limit."""
+        return count(True for _ in itertools.islice(self.solutions(), limit))
+
+
+class ExactCoverSudoku(ExactCover):
+    """A Sudoku as an exact cover problem, for n^2 x n^2 grids of n x n boxes.
+    Row i*N + d (with N = n^2) stands for putting the d-th symbol in cell i,
+    counting cells row by row; it covers four columns: cell i is filled, and
+    the row, column and box of cell i have the d-th symbol. The grid can be a
+    Sudoku, a string or a sequence of N^2 numbers. In a string '.' or '0' is an
+    empty cell, the symbols are 1-9 then A-Z, and any other characters are
+    ignored; in a sequence 0 is empty and the symbols are 1..N. solve and
+    grid give filled grids of the same kind: for a Sudoku, an assignment.
+    >>> ExactCoverSudoku(easy1).solve()
+    '483921657967345821251876493548132976729564138136798245372689514814253769695417382'
+    >>> ExactCoverSudoku(harder1).count(limit=2)
+    1
+    >>> ExactCoverSudoku([1, 0, 0, 0, 0, 0, 3, 0, 0, 4, 0, 0, 0, 0, 0, 2]).solve()
+    [1, 3, 2, 4, 4, 2, 3, 1, 2, 4, 1, 3, 3, 1, 4, 2]
+    >>> ExactCoverSudoku([1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]).count()
+    72
+    >>> e = Sudoku(easy1)
+    >>> AC3(e)  # doctest: +ELLIPSIS
+    (True, ...)
+    >>> ExactCoverSudoku(e).solve() == e.infer_assignment()
+    True
+    """
+
+    symbols = '123456789' + string.ascii_uppercase
+
+    templates = {}  # N: (columns, rows) of the empty N x N grid; rows are shared
+
+    def __init__(self, grid):
+        if isinstance(grid, Sudoku):
+            values = [grid.domains[var] for var in flatten(grid.rows)]
+            cells = [self.symbols.index(v[0]) + 1 if len(v) == 1 else 0 for v in values]
+            self.output = lambda cells: {var: self.symbols[d - 1]
+                                         for var, d in zip(flatten(grid.rows), cells)}
+        elif isinstance(grid, str):
+            cells = ['.0'.find(ch) < 0 and self.symbols.find(ch) + 1 for ch in grid
+                     if ch in '.0' or ch in self.symbols]
+            self.output = lambda cells: ''.join(self.symbols[d - 1] for d in cells)
+        else:
+            cells = list(grid)
+            self.output = list
+        N = int(round(len(cells) ** 0.25)) ** 2
+        if not cells or N * N != len(cells) or not all(0 <= d <= N for d in cells):
+            raise ValueError("Not a Sudoku grid", grid)
+        self.N, self.cells = N, cells
+        if N not in self.templates:
+            n = int(round(N ** 0.5))
+            rows = {i * N + d: [i, N * N + i // N * N + d, 2 * N * N + i % N * N + d,
+                                3 * N * N + (i // N // n * n + i % N // n) * N + d]
+                    for i in range(N * N) for d in range(N)}
+            self.templates[N] = ExactCover.from_rows(rows)
+        template = self.templates[N]
+        super().__init__({col: set(rows) for col, rows in template.columns.items()}, template.rows)
+        # the givens are covered for good; a given that clashes with one
+        # before it leaves the puzzle without solutions
+        self.consistent = True
+        for i, d in enumerate(cells):
+            if d:
+                if i * N + d - 1 not in self.columns.get(i, ()):
+                    self.consistent = False
+                    break
+                self.cover(i * N + d - 1)
+
+    def solutions(self):
+        if self.consistent:
+            yield from super().solutions()
+
+    def grid(self, solution):
+        """The grid filled in with the rows of solution."""
+        cells = list(self.cells)
+        for row in solution:
+            cells[row // self.N] = row % self.N + 1
+        return self.output(cells)
+
+    def solution(self):
+        """Some solution (a list of rows), or None if there is none."""
+        return next(self.solutions(), None)
+
+    def solve(self):
+        """The filled grid of some solution, or None if there is none."""
+        solution = self.solution()
+        return None if solution is None else self.grid(solution)
+
+
+def sudoku_solutions(grid, limit=1):
+    """The filled grids of up to limit solutions of the Sudoku grid (all of
+    them if limit is None). With limit=2, the grid has a unique solution
+    exactly when one grid comes back."""
+    puzzle = ExactCoverSudoku(grid)
+    return [puzzle.grid(solution) for solution in itertools.islice(puzzle.solutions(), limit)]
+
+
+def solve_batch(grids, limit=1, processes=None, chunksize=None):
+    """sudoku_solutions(grid, limit) for each of grids, in order, computed on
+    a pool of processes (default: one per CPU); processes=1 solves them here.
+    The grids should be strings or sequences, which are cheap to send to the
+    workers; chunksize is as for multiprocessing.Pool.map.
+    >>> puzzles = [easy1, harder1, '1' + '.' * 80]
+    >>> [len(solutions) for solutions in solve_batch(puzzles, limit=2, processes=1)]
+    [1, 1, 2]
+    """
+    solve = functools.partial(sudoku_solutions, limit=limit)
+    if processes == 1:
+        return list(map(solve, grids))
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(solve, grids, chunksize)
+
+
 # ______________________________________________________________________________
 # The Zebra Puzzle
 
@@ -959,6 +1873,67 @@ class Constraint:
         return self.condition(*tuple(assignment[v] for v in self.scope))
 
 
+class Table:
+    """The allowed tuples of a positive table constraint: rows, a list of
+    sequences (tuples, or strings, say) of the same length. Rows are indexed
+    by (position, value): supports[i][v] is the bitset of the rows whose i-th
+    element is v, row k being bit k of an int.
+    >>> t = Table(['ant', 'art', 'bus'])
+    >>> bin(t.supports[1]['n']), bin(t.supports[0]['a'])
+    ('0b1', '0b11')
+    >>> t('b', 'u', 's'), t('b', 'u', 't')
+    (True, False)
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.members = set(map(tuple, self.rows))
+        nbytes = (len(self.rows) + 7) // 8
+        self.supports = []
+        for i in range(len(self.rows[0]) if self.rows else 0):
+            # a bytearray for each value, turned into an int at the end; oring
+            # bits into an int one row at a time would take quadratic time
+            bitmaps = defaultdict(lambda: bytearray(nbytes))
+            for k, row in enumerate(self.rows):
+                bitmaps[row[i]][k >> 3] |= 1 << (k & 7)
+            self.supports.append({v: int.from_bytes(bitmap, 'little')
+                                  for v, bitmap in bitmaps.items()})
+
+    def __call__(self, *values):
+        return values in self.members
+
+
+class TableConstraint(Constraint):
+    """A constraint that holds for the tuples of values in table (a Table, or
+    a list of rows), made generalized arc consistent by compact-table
+    filtering: the rows still possible are those whose every element is in
+    the domain of its variable, found as the and, over the variables, of the
+    or of the bitsets of the values in its domain; a value is supported if
+    its bitset meets them. That is a few operations on ints per value, where
+    any_holds would try out every combination of values of the other
+    variables. ACSolver.GAC uses supported for these constraints."""
+
+    def __init__(self, scope, table):
+        self.table = table if isinstance(table, Table) else Table(table)
+        super().__init__(tuple(scope), self.table)
+
+    def __repr__(self):
+        return 'table' + str(self.scope)
+
+    def supported(self, domains, var):
+        """The values in domains[var] that have a support in the constraint."""
+        supports = self.table.supports
+        if not self.table.rows:
+            return set()
+        rows = -1  # all of them
+        for i, v in enumerate(self.scope):
+            rows &= reduce(or_, (supports[i].get(x, 0) for x in domains[v]), 0)
+            if not rows:
+                return set()
+        column = supports[self.scope.index(var)]
+        return {x for x in domains[var] if column.get(x, 0) & rows}
+
+
 def all_diff_constraint(*values):
     """Returns True if all values are different, False otherwise"""
     return len(values) is len(set(values))
@@ -973,6 +1948,15 @@ def is_word_constraint(words):
     return isw
 
 
+def word_tables(words):
+    """A dict {n: Table of the words of length n}, indexing words by length and
+    by (position, letter), for the TableConstraints of a Crossword."""
+    by_length = defaultdict(list)
+    for word in sorted(set(words)):
+        by_length[len(word)].append(word)
+    return {n: Table(ws) for n, ws in by_length.items()}
+
+
 def meet_at_constraint(p1, p2):
     """Returns a function that is True when the words meet at the positions (p1, p2), False otherwise"""
 
@@ -1055,7 +2039,10 @@ class ACSolver:
             var, const = to_do.pop()
             other_vars = [ov for ov in const.scope if ov != var]
             new_domain = set()
-            if len(other_vars) == 0:
+            if isinstance(const, TableConstraint):
+                new_domain = const.supported(domains, var)
+                checks += len(domains[var])
+            elif len(other_vars) == 0:
                 for val in domains[var]:
                     if const.holds({var: val}):
                         new_domain.add(val)
@@ -1225,8 +2212,23 @@ words1 = {'ant', 'big', 'bus', 'car', 'has', 'book', 'buys', 'hold',
 
 
 class Crossword(NaryCSP):
+    """A crossword puzzle: each run of two or more '_' squares, across or down,
+    must spell a word. words can be a set of words or, so that a big
+    dictionary is indexed only once for many puzzles, the result of calling
+    word_tables on it; each run gets a TableConstraint with the words of its
+    length.
+    >>> cw = Crossword(crossword1, words1)
+    >>> solution = ac_solver(cw)
+    >>> len(solution), cw.consistent(solution)
+    (15, True)
+    """
 
     def __init__(self, puzzle, words):
+        tables = words if isinstance(words, dict) else word_tables(words)
+
+        def word_constraint(scope):
+            return TableConstraint(scope, tables.get(len(scope)) or Table([]))
+
         domains = {}
         constraints = []
         for i, line in enumerate(puzzle):
@@ -1238,10 +2240,10 @@ class Crossword(NaryCSP):
                     scope.append(var)
                 else:
                     if len(scope) > 1:
-                        constraints.append(Constraint(tuple(scope), is_word_constraint(words)))
+                        constraints.append(word_constraint(scope))
                     scope.clear()
             if len(scope) > 1:
-                constraints.append(Constraint(tuple(scope), is_word_constraint(words)))
+                constraints.append(word_constraint(scope))
         puzzle_t = list(map(list, zip(*puzzle)))
         for i, line in enumerate(puzzle_t):
             scope = []
@@ -1250,10 +2252,10 @@ class Crossword(NaryCSP):
                     scope.append("p" + str(i) + str(j))
                 else:
                     if len(scope) > 1:
-                        constraints.append(Constraint(tuple(scope), is_word_constraint(words)))
+                        constraints.append(word_constraint(scope))
                     scope.clear()
             if len(scope) > 1:
-                constraints.append(Constraint(tuple(scope), is_word_constraint(words)))
+                constraints.append(word_constraint(scope))
         super().__init__(domains, constraints)
         self.puzzle = puzzle
 
@@ -6,9 +6,20 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import csv
+import json
+import multiprocessing
+import multiprocessing.connection
 import sys
+import tempfile
+import time
 from collections import deque
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
 from utils import *
 
 
@@ -56,6 +67,24 @@ class Problem:
         and action. The default method costs 1 for every step in the path."""
         return c + 1
 
+    def key(self, state):
+        """Return the hashable key that graph searches use to tell states
+        apart in their explored sets and frontiers. The default is the state
+        itself; a problem can return a cheaper one, such as an integer hash
+        that result_key keeps up to date (see ZobristTable)."""
+        return state
+
+    def result_key(self, key, state, action, next_state):
+        """Return the key of next_state, reached from state (whose key is key)
+        by action. Override this to update the key incrementally."""
+        return self.key(next_state)
+
+    def frontier_size(self, size):
+        """Called by the tree and graph searches with the number of nodes on
+        their frontier before each expansion. The default does nothing;
+        InstrumentedProblem keeps the largest size."""
+        pass
+
     def value(self, state):
         """For optimization problems, each state has a value. Hill Climbing
         and related algorithms try to maximize this value."""
@@ -73,14 +102,22 @@ class Node:
     the total path_cost (also known as g) to reach the node. Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    subclass this class. Nodes use __slots__ rather than a per-instance
+    __dict__, since large searches create millions of them; the f and h
+    slots are left unset until a search function fills them in. A node is
+    hashed by its key, which is its state unless it was given another key
+    (from problem.key); such keys pass on to its children through
+    problem.result_key."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h', 'key')
 
-    def __init__(self, state, parent=None, action=None, path_cost=0):
+    def __init__(self, state, parent=None, action=None, path_cost=0, key=None):
         """Create a search tree Node, derived from a parent by an action."""
         self.state = state
         self.parent = parent
         self.action = action
         self.path_cost = path_cost
+        self.key = state if key is None else key
         self.depth = 0
         if parent:
             self.depth = parent.depth + 1
@@ -100,6 +137,8 @@ class Node:
         """[Figure 3.10]"""
         next_state = problem.result(self.state, action)
         next_node = Node(next_state, self, action, problem.path_cost(self.path_cost, self.state, action, next_state))
+        if self.key is not self.state:
+            next_node.key = problem.result_key(self.key, self.state, action, next_state)
         return next_node
 
     def solution(self):
@@ -120,14 +159,37 @@ class Node:
     # want in other contexts.]
 
     def __eq__(self, other):
-        return isinstance(other, Node) and self.state == other.state
+        return isinstance(other, Node) and self.key == other.key
 
     def __hash__(self):
-        # We use the hash value of the state
+        # We use the hash value of the state's key
         # stored in the node instead of the node
         # object itself to quickly search a node
         # with the same state in a Hash Table
-        return hash(self.state)
+        return hash(self.key)
+
+
+class ZobristTable:
+    """Zobrist hashing for states that are tuples of a fixed length whose
+    entries come from a known set of values. Each (position, value) pair
+    gets a random 64-bit number, and a state hashes to the exclusive or of
+    the numbers for its entries. Changing one entry changes the hash by two
+    exclusive ors, so a problem's result_key can follow its moves cheaply."""
+
+    def __init__(self, length, values, seed=None):
+        rng = random.Random(seed)
+        self.table = [{v: rng.getrandbits(64) for v in values} for _ in range(length)]
+
+    def hash(self, state):
+        """The hash of a whole state."""
+        h = 0
+        for entry, value in zip(self.table, state):
+            h ^= entry[value]
+        return h
+
+    def update(self, h, i, old, new):
+        """The hash of a state with hash h after entry i changes from old to new."""
+        return h ^ self.table[i][old] ^ self.table[i][new]
 
 
 # ______________________________________________________________________________
@@ -187,6 +249,7 @@ def breadth_first_tree_search(problem):
     frontier = deque([Node(problem.initial)])  # FIFO queue
 
     while frontier:
+        problem.frontier_size(len(frontier))
         node = frontier.popleft()
         if problem.goal_test(node.state):
             return node
@@ -206,6 +269,7 @@ def depth_first_tree_search(problem):
     frontier = [Node(problem.initial)]  # Stack
 
     while frontier:
+        problem.frontier_size(len(frontier))
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
@@ -222,16 +286,18 @@ def depth_first_graph_search(problem):
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
     """
-    frontier = [(Node(problem.initial))]  # Stack
+    frontier = [Node(problem.initial, key=problem.key(problem.initial))]  # Stack
 
-    explored = set()
+    reached = {frontier[0].key}  # keys of states that are explored or on the frontier
     while frontier:
+        problem.frontier_size(len(frontier))
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
-        explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        for child in node.expand(problem):
+            if child.key not in reached:
+                reached.add(child.key)
+                frontier.append(child)
     return None
 
 
@@ -241,22 +307,152 @@ def breadth_first_graph_search(problem):
     single line as below:
     return graph_search(problem, FIFOQueue())
     """
-    node = Node(problem.initial)
+    node = Node(problem.initial, key=problem.key(problem.initial))
     if problem.goal_test(node.state):
         return node
     frontier = deque([node])
-    explored = set()
+    reached = {node.key}  # keys of states that are explored or on the frontier
     while frontier:
+        problem.frontier_size(len(frontier))
         node = frontier.popleft()
-        explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.key not in reached:
                 if problem.goal_test(child.state):
                     return child
+                reached.add(child.key)
                 frontier.append(child)
     return None
 
 
+def external_breadth_first_search(problem, directory=None, run_size=1_000_000,
+                                  reversible=False, stats=None, display=False):
+    """Breadth-first graph search that keeps its layers on disk instead of
+    in RAM, for state spaces too big for breadth_first_graph_search. The
+    problem supplies a codec: problem.encode(state) returns a bytes record of
+    the same length for every state, and problem.decode(record) inverts it.
+    Each layer is a file of sorted records. Successors of the current layer
+    are buffered, and every run_size of them are sorted into a run file; the
+    runs are then merged, dropping duplicates and any state already in an
+    earlier layer (delayed duplicate detection), to give the next layer.
+    If every action can be undone (reversible), only the previous two layers
+    need to be subtracted. The path to a goal is rebuilt by scanning earlier
+    layers for a parent of each state. Files go in a temporary directory
+    inside directory (or the system default) that is removed afterwards.
+    If a list is given as stats, a dict (depth, states, generated, runs) is
+    appended to it for every layer. With a small run_size, later layers are
+    merged from several runs:
+    >>> puzzle = EightPuzzle((4, 1, 2, 0, 5, 3, 7, 8, 6))
+    >>> stats = []
+    >>> node = external_breadth_first_search(puzzle, run_size=4, reversible=True, stats=stats)
+    >>> len(node.solution()) == len(breadth_first_graph_search(puzzle).solution()), node.state
+    (True, (1, 2, 3, 4, 5, 6, 7, 8, 0))
+    >>> [layer['runs'] for layer in stats]
+    [1, 2, 3, 7, 8]
+    >>> external_breadth_first_search(puzzle, run_size=4).solution() == node.solution()
+    True
+    """
+    encode, decode = problem.encode, problem.decode
+    if problem.goal_test(problem.initial):
+        return Node(problem.initial)
+    width = len(encode(problem.initial))
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        layers = [os.path.join(tmp, 'layer0')]
+        write_records(layers[0], [encode(problem.initial)])
+        goal = None
+        while goal is None:
+            runs, buffer, generated = [], [], 0
+            for record in read_records(layers[-1], width):
+                state = decode(record)
+                for action in problem.actions(state):
+                    buffer.append(encode(problem.result(state, action)))
+                if len(buffer) >= run_size:
+                    generated += len(buffer)
+                    runs.append(os.path.join(tmp, 'run{}'.format(len(runs))))
+                    write_records(runs[-1], sorted(set(buffer)))
+                    buffer = []
+            generated += len(buffer)
+            runs.append(os.path.join(tmp, 'run{}'.format(len(runs))))
+            write_records(runs[-1], sorted(set(buffer)))
+            del buffer
+
+            new = heapq.merge(*[read_records(run, width) for run in runs])
+            old = heapq.merge(*[read_records(layer, width)
+                                for layer in (layers[-2:] if reversible else layers)])
+
+            def fresh_records():
+                nonlocal goal
+                for record in sorted_difference(new, old):
+                    yield record
+                    if problem.goal_test(decode(record)):
+                        goal = record
+                        return
+
+            layers.append(os.path.join(tmp, 'layer{}'.format(len(layers))))
+            count = write_records(layers[-1], fresh_records())
+            for run in runs:
+                os.remove(run)
+            if stats is not None:
+                stats.append(dict(depth=len(layers) - 1, states=count, generated=generated,
+                                  runs=len(runs)))
+            if display:
+                print("depth", len(layers) - 1, ":", count, "new states from", generated,
+                      "successors in", len(runs), "runs")
+            if count == 0:
+                return None
+
+        actions = []
+        for layer in reversed(layers[:-1]):
+            for record in read_records(layer, width):
+                state = decode(record)
+                action = first(a for a in problem.actions(state)
+                               if encode(problem.result(state, a)) == goal)
+                if action is not None:
+                    actions.append(action)
+                    goal = record
+                    break
+    node = Node(problem.initial)
+    for action in reversed(actions):
+        node = node.child_node(problem, action)
+    return node
+
+
+def read_records(file, width, block=1 << 16):
+    """Yield the fixed-width records in a file, reading block of them at a time."""
+    with open(file, 'rb') as f:
+        while True:
+            data = f.read(width * block)
+            if not data:
+                return
+            for i in range(0, len(data), width):
+                yield data[i:i + width]
+
+
+def write_records(file, records):
+    """Write an iterable of bytes records to a file; return how many there were."""
+    count = 0
+    with open(file, 'wb') as f:
+        for record in records:
+            f.write(record)
+            count += 1
+    return count
+
+
+def sorted_difference(items, exclude):
+    """Yield each distinct item of the sorted iterable items that is not in
+    the sorted iterable exclude, in one merging pass over both."""
+    exclude = iter(exclude)
+    other = next(exclude, None)
+    previous = None
+    for item in items:
+        if item == previous:
+            continue
+        previous = item
+        while other is not None and other < item:
+            other = next(exclude, None)
+        if item != other:
+            yield item
+
+
 def best_first_graph_search(problem, f, display=False):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
@@ -264,26 +460,29 @@ def best_first_graph_search(problem, f, display=False):
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    The frontier is an IndexedPriorityQueue, so testing whether a state is on
+    the frontier and replacing it with a cheaper node are both cheap. States
+    are told apart by problem.key, which may be a cheap incremental hash."""
     f = memoize(f, 'f')
-    node = Node(problem.initial)
-    frontier = PriorityQueue('min', f)
+    node = Node(problem.initial, key=problem.key(problem.initial))
+    frontier = IndexedPriorityQueue('min', f)
     frontier.append(node)
-    explored = set()
+    explored = set()  # keys of expanded states
     while frontier:
+        problem.frontier_size(len(frontier))
         node = frontier.pop()
         if problem.goal_test(node.state):
             if display:
                 print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
             return node
-        explored.add(node.state)
+        explored.add(node.key)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.key not in explored and child not in frontier:
                 frontier.append(child)
             elif child in frontier:
                 if f(child) < frontier[child]:
-                    del frontier[child]
-                    frontier.append(child)
+                    frontier.append(child)  # replaces the costlier entry
     return None
 
 
@@ -327,79 +526,133 @@ def iterative_deepening_search(problem):
 # Pseudocode from https://webdocs.cs.ualberta.ca/%7Eholte/Publications/MM-AAAI2016.pdf
 
 def bidirectional_search(problem):
-    e = 0
-    if isinstance(problem, GraphProblem):
-        e = problem.find_min_edge()
-    gF, gB = {Node(problem.initial): 0}, {Node(problem.goal): 0}
-    openF, openB = [Node(problem.initial)], [Node(problem.goal)]
-    closedF, closedB = [], []
-    U = np.inf
-
-    def extend(U, open_dir, open_other, g_dir, g_other, closed_dir):
-        """Extend search in given direction"""
-        n = find_key(C, open_dir, g_dir)
-
-        open_dir.remove(n)
-        closed_dir.append(n)
-
-        for c in n.expand(problem):
-            if c in open_dir or c in closed_dir:
-                if g_dir[c] <= problem.path_cost(g_dir[n], n.state, None, c.state):
-                    continue
-
-                open_dir.remove(c)
-
-            g_dir[c] = problem.path_cost(g_dir[n], n.state, None, c.state)
-            open_dir.append(c)
-
-            if c in open_other:
-                U = min(U, g_dir[c] + g_other[c])
-
-        return U, open_dir, closed_dir, g_dir
-
-    def find_min(open_dir, g):
-        """Finds minimum priority, g and f values in open_dir"""
-        # pr_min_f isn't forward pr_min instead it's the f-value
-        # of node with priority pr_min.
-        pr_min, pr_min_f = np.inf, np.inf
-        for n in open_dir:
-            f = g[n] + problem.h(n)
-            pr = max(f, 2 * g[n])
-            pr_min = min(pr_min, pr)
-            pr_min_f = min(pr_min_f, f)
-
-        return pr_min, pr_min_f, min(g.values())
-
-    def find_key(pr_min, open_dir, g):
-        """Finds key in open_dir with value equal to pr_min
-        and minimum g value."""
-        m = np.inf
-        node = Node(-1)
-        for n in open_dir:
-            pr = max(g[n] + problem.h(n), 2 * g[n])
-            if pr == pr_min:
-                if g[n] < m:
-                    m = g[n]
-                    node = n
+    """Return the cost of an optimal solution found by searching forward from
+    the initial state and backward from the goal at the same time, or np.inf
+    if there is none. See bidirectional_astar_search."""
+    node = bidirectional_astar_search(problem)
+    return node.path_cost if node else np.inf
+
+
+def bidirectional_astar_search(problem, h=None, h_reverse=None, display=False):
+    """Meet-in-the-middle (MM) bidirectional A* search. A forward search from
+    problem.initial and a backward search from problem.goal each expand the
+    node with the lowest priority max(f(n), 2 * g(n)), and the search stops
+    as soon as the best solution found so far, U, is no worse than the lower
+    bound max(C, fminF, fminB, gminF + gminB + e), where C is the smallest
+    priority on either frontier and e is the cheapest edge cost. Returns the
+    goal Node of an optimal forward path (so .solution() works as usual) or
+    None.
+    h estimates the cost to reach the goal and defaults to problem.h;
+    h_reverse estimates the cost to reach the initial state and defaults to
+    problem.reverse_h if the problem has one, else to 0. The backward search
+    uses problem.reverse_actions(state) and problem.reverse_result(state,
+    action) to step from a state to its predecessors; problems without them
+    are assumed to be reversible, and actions/result are used instead.
+    >>> romania = GraphProblem('Arad', 'Bucharest', romania_map)
+    >>> node = bidirectional_astar_search(romania)
+    >>> node.path_cost == astar_search(romania).path_cost, node.solution()
+    (True, ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest'])
+
+    On a directed graph the backward search follows links against their
+    direction, so it cannot take the one-way shortcut G -> B -> S:
+    >>> one_way = Graph(dict(S=dict(A=5), A=dict(G=5), G=dict(B=1), B=dict(S=1)))
+    >>> zero = lambda n: 0
+    >>> node = bidirectional_astar_search(GraphProblem('S', 'G', one_way), zero, zero)
+    >>> node.solution(), node.path_cost
+    (['A', 'G'], 10)
+    """
+    h = h or problem.h
+    h_reverse = h_reverse or getattr(problem, 'reverse_h', lambda node: 0)
+    e = problem.find_min_edge() if isinstance(problem, GraphProblem) else 0
+
+    def forward_children(node):
+        return node.expand(problem)
+
+    reverse_actions = getattr(problem, 'reverse_actions', problem.actions)
+    reverse_result = getattr(problem, 'reverse_result', problem.result)
+
+    def backward_children(node):
+        for action in reverse_actions(node.state):
+            prev_state = reverse_result(node.state, action)
+            yield Node(prev_state, node, action,
+                       problem.path_cost(node.path_cost, prev_state, None, node.state))
+
+    class Direction:
+        """The open lists, reached nodes and closed states of one search."""
+
+        def __init__(self, start, h, children):
+            f = memoize(lambda n: n.path_cost + h(n), 'f')
+            # MM breaks ties on priority in favour of the smaller g
+            self.by_pr = IndexedPriorityQueue('min',
+                                              lambda n: (max(f(n), 2 * n.path_cost), n.path_cost))
+            self.by_f = IndexedPriorityQueue('min', f)
+            self.by_g = IndexedPriorityQueue('min', lambda n: n.path_cost)
+            self.reached = {}
+            self.closed = set()
+            self.children = children
+            self.add(Node(start))
+
+        def add(self, node):
+            self.reached[node.state] = node
+            self.closed.discard(node.state)
+            for frontier in (self.by_pr, self.by_f, self.by_g):
+                frontier.append(node)
+
+        def pop(self):
+            node = self.by_pr.pop()
+            del self.by_f[node]
+            del self.by_g[node]
+            self.closed.add(node.state)
+            return node
 
-        return node
+        def __len__(self):
+            return len(self.by_pr)
 
-    while openF and openB:
-        pr_min_f, f_min_f, g_min_f = find_min(openF, gF)
-        pr_min_b, f_min_b, g_min_b = find_min(openB, gB)
-        C = min(pr_min_f, pr_min_b)
+    fwd = Direction(problem.initial, h, forward_children)
+    bwd = Direction(problem.goal, h_reverse, backward_children)
+    U, meeting = np.inf, None
+    if problem.goal_test(problem.initial):
+        U, meeting = 0, (fwd.reached[problem.initial], bwd.reached[problem.goal])
 
-        if U <= max(C, f_min_f, f_min_b, g_min_f + g_min_b + e):
-            return U
+    while fwd and bwd:
+        C = min(fwd.by_pr.heap[0][0][0], bwd.by_pr.heap[0][0][0])
+        if meeting and U <= max(C, fwd.by_f.heap[0][0], bwd.by_f.heap[0][0],
+                                fwd.by_g.heap[0][0] + bwd.by_g.heap[0][0] + e):
+            break
+        this, other = (fwd, bwd) if fwd.by_pr.heap[0][0] <= bwd.by_pr.heap[0][0] else (bwd, fwd)
+        node = this.pop()
+        for child in this.children(node):
+            old = this.reached.get(child.state)
+            if old is not None:
+                if old.path_cost <= child.path_cost:
+                    continue
+                if old in this.by_pr:
+                    del this.by_pr[old], this.by_f[old], this.by_g[old]
+            this.add(child)
+            match = other.reached.get(child.state)
+            if match is not None and child.path_cost + match.path_cost < U:
+                U = child.path_cost + match.path_cost
+                meeting = (child, match) if this is fwd else (match, child)
+
+    if display:
+        print(len(fwd.closed) + len(bwd.closed), "paths have been expanded and",
+              len(fwd) + len(bwd), "paths remain in the frontier")
+    if meeting is None:
+        return None
+    return join_bidirectional_path(problem, *meeting)
 
-        if C == pr_min_f:
-            # Extend forward
-            U, openF, closedF, gF = extend(U, openF, openB, gF, gB, closedF)
-        else:
-            # Extend backward
-            U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB)
 
-    return np.inf
+def join_bidirectional_path(problem, forward_node, backward_node):
+    """Extend forward_node along the states of backward_node's path back to
+    the goal, choosing at each step the cheapest forward action that reaches
+    the next state, and return the resulting goal Node."""
+    node, back = forward_node, backward_node.parent
+    while back is not None:
+        node = min((node.child_node(problem, action) for action in problem.actions(node.state)
+                    if problem.result(node.state, action) == back.state),
+                   key=lambda child: child.path_cost)
+        back = back.parent
+    return node
 
 
 # ______________________________________________________________________________
@@ -420,17 +673,145 @@ def astar_search(problem, h=None, display=False):
     return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
 
 
+def anytime_astar_solutions(problem, h=None, weights=(5, 3, 2, 1.5, 1.2, 1), time_limit=None):
+    """Anytime Repairing A* (ARA*): a series of weighted A* searches, with
+    f(n) = g(n) + w * h(n), for each of the decreasing weights w. Each search
+    reuses the work of the ones before it: it expands a state again only if
+    a cheaper path to it has been found since. This is a generator that
+    yields (node, bound) after each search, where node is the best solution
+    found so far and bound is a proven limit on how many times costlier than
+    optimal it can be (1 once it is known to be optimal). Given time_limit,
+    in seconds, it stops when time runs out, first yielding the best solution
+    found by the interrupted search, if it has improved on the last one; a
+    caller can also stop at any time and keep the last solution.
+    >>> romania = GraphProblem('Arad', 'Bucharest', romania_map)
+    >>> [(node.path_cost, round(bound, 2))
+    ...  for node, bound in anytime_astar_solutions(romania, weights=(3, 1))]
+    [(450, 1.11), (418, 1)]
+    >>> list(anytime_astar_solutions(GraphProblem('Arad', 'Arad', romania_map)))
+    [(<Node Arad>, 1)]
+
+    A search that runs out of time still returns what it has found, here the
+    expensive direct way to the goal (-1), before it has reached the end of
+    an endless chain of cheap steps:
+    >>> class Chain(Problem):
+    ...     def actions(self, state):
+    ...         return [-1, 1] if state == 0 else [state + 1]
+    ...     def path_cost(self, c, state1, action, state2):
+    ...         return c + (10 ** 6 if state2 == -1 else 1)
+    ...     def result(self, state, action):
+    ...         return action
+    >>> anytime_astar_search(Chain(0, -1), h=lambda n: 0, weights=(1,), time_limit=0.1).path_cost
+    1000000
+    """
+    h = memoize(h or problem.h, 'h')
+    deadline = time.time() + time_limit if time_limit is not None else np.inf
+    node = Node(problem.initial, key=problem.key(problem.initial))
+    incumbent = node if problem.goal_test(node.state) else None
+    best = {node.key: node}  # the cheapest node found for each state
+    waiting = [node]  # nodes to put on the next search's frontier
+    proven = np.inf  # the bound proven by the last search to finish
+
+    def suboptimality(w, waiting):
+        """The bound on incumbent, given the nodes not yet expanded."""
+        if incumbent.path_cost == 0:
+            return 1  # nothing is cheaper than a free solution
+        lower = min((n.path_cost + h(n) for n in waiting), default=np.inf)
+        return max(1, min(w, incumbent.path_cost / lower)) if lower > 0 else w
+
+    for w in weights:
+        frontier = IndexedPriorityQueue('min', lambda n: n.path_cost + w * h(n))
+        for node in waiting:
+            frontier.append(node)
+        closed, inconsistent = set(), {}
+        found = incumbent
+        while frontier and (incumbent is None or incumbent.path_cost > frontier.heap[0][0]):
+            if time.time() > deadline:
+                if incumbent is not found:
+                    # this search has not finished, so w bounds nothing yet
+                    yield incumbent, suboptimality(proven, [n for _, n in frontier.heap] +
+                                                   list(inconsistent.values()))
+                return
+            node = frontier.pop()
+            closed.add(node.key)
+            if problem.goal_test(node.state):
+                continue
+            for child in node.expand(problem):
+                old = best.get(child.key)
+                if old is None or child.path_cost < old.path_cost:
+                    best[child.key] = child
+                    if problem.goal_test(child.state) and (
+                            incumbent is None or child.path_cost < incumbent.path_cost):
+                        incumbent = child
+                    if child.key in closed:
+                        inconsistent[child.key] = child
+                    else:
+                        frontier.append(child)
+        if incumbent is None:
+            return
+        waiting = [n for _, n in frontier.heap] + list(inconsistent.values())
+        bound = proven = suboptimality(w, waiting)
+        yield incumbent, bound
+        if bound == 1:
+            return
+
+
+def anytime_astar_search(problem, h=None, weights=(5, 3, 2, 1.5, 1.2, 1), time_limit=None,
+                         display=False):
+    """Run anytime_astar_solutions until the solution is proven optimal or
+    time_limit seconds have passed, and return the best solution found."""
+    node = None
+    for node, bound in anytime_astar_solutions(problem, h, weights, time_limit):
+        if display:
+            print("cost", node.path_cost, "is within a factor", bound, "of optimal")
+    return node
+
+
+def beam_search(problem, h=None, width=100, time_limit=None):
+    """Breadth-first search that keeps only the width best nodes of each
+    layer, those with the lowest f(n) = g(n) + h(n), so memory is bounded by
+    width times the depth. It is incomplete: the goal may lie beyond a node
+    that was dropped, in which case (or if time_limit seconds pass) it
+    returns None."""
+    h = memoize(h or problem.h, 'h')
+    deadline = time.time() + time_limit if time_limit is not None else np.inf
+    node = Node(problem.initial, key=problem.key(problem.initial))
+    if problem.goal_test(node.state):
+        return node
+    beam = [node]
+    reached = {node.key}
+    while beam:
+        if time.time() > deadline:
+            return None
+        children = {}
+        for node in beam:
+            for child in node.expand(problem):
+                if child.key not in reached:
+                    if problem.goal_test(child.state):
+                        return child
+                    if child.key not in children or child.path_cost < children[child.key].path_cost:
+                        children[child.key] = child
+        beam = heapq.nsmallest(width, children.values(), key=lambda n: n.path_cost + h(n))
+        reached.update(n.key for n in beam)
+    return None
+
+
 # ______________________________________________________________________________
 # A* heuristics 
 
 class EightPuzzle(Problem):
     """ The problem of sliding tiles numbered from 1 to 8 on a 3x3 board, where one of the
     squares is a blank. A state is represented as a tuple of length 9, where  element at
-    index i represents the tile number  at index i (0 if it's an empty square) """
+    index i represents the tile number  at index i (0 if it's an empty square).
+    Larger n x n boards work the same way when given a goal of length n * n.
+    With hashing=True, graph searches key states on a Zobrist hash that each
+    move updates incrementally. """
 
-    def __init__(self, initial, goal=(1, 2, 3, 4, 5, 6, 7, 8, 0)):
+    def __init__(self, initial, goal=(1, 2, 3, 4, 5, 6, 7, 8, 0), hashing=False):
         """ Define goal state and initialize a problem """
         super().__init__(initial, goal)
+        self.n = exact_sqrt(len(goal))
+        self.zobrist = ZobristTable(len(goal), range(len(goal))) if hashing else None
 
     def find_blank_square(self, state):
         """Return the index of the blank square in a given state"""
@@ -444,14 +825,15 @@ class EightPuzzle(Problem):
 
         possible_actions = ['UP', 'DOWN', 'LEFT', 'RIGHT']
         index_blank_square = self.find_blank_square(state)
+        n = self.n
 
-        if index_blank_square % 3 == 0:
+        if index_blank_square % n == 0:
             possible_actions.remove('LEFT')
-        if index_blank_square < 3:
+        if index_blank_square < n:
             possible_actions.remove('UP')
-        if index_blank_square % 3 == 2:
+        if index_blank_square % n == n - 1:
             possible_actions.remove('RIGHT')
-        if index_blank_square > 5:
+        if index_blank_square >= n * n - n:
             possible_actions.remove('DOWN')
 
         return possible_actions
@@ -464,19 +846,56 @@ class EightPuzzle(Problem):
         blank = self.find_blank_square(state)
         new_state = list(state)
 
-        delta = {'UP': -3, 'DOWN': 3, 'LEFT': -1, 'RIGHT': 1}
+        delta = {'UP': -self.n, 'DOWN': self.n, 'LEFT': -1, 'RIGHT': 1}
         neighbor = blank + delta[action]
         new_state[blank], new_state[neighbor] = new_state[neighbor], new_state[blank]
 
         return tuple(new_state)
 
+    def key(self, state):
+        """ The Zobrist hash of the state if hashing, else the state itself """
+
+        return self.zobrist.hash(state) if self.zobrist else state
+
+    def result_key(self, key, state, action, next_state):
+        """ Update the key for a move: the blank and the tile it swaps with change places.
+        Keys are 64-bit, so two distinct states may collide on the same key; explored
+        and frontier then take one for the other, and the search may skip a state. The
+        odds are about m*m / 2**65 for m states, negligible for puzzles that fit in memory. """
+
+        if not self.zobrist:
+            return next_state
+        blank = self.find_blank_square(state)
+        delta = {'UP': -self.n, 'DOWN': self.n, 'LEFT': -1, 'RIGHT': 1}
+        neighbor = blank + delta[action]
+        tile, table = state[neighbor], self.zobrist.table
+        return (key ^ table[blank][0] ^ table[blank][tile]
+                ^ table[neighbor][tile] ^ table[neighbor][0])
+
     def goal_test(self, state):
         """ Given a state, return True if state is a goal state or False, otherwise """
 
         return state == self.goal
 
+    def encode(self, state):
+        """ Pack a state into bytes, one per square, for external_breadth_first_search """
+
+        return bytes(state)
+
+    def decode(self, record):
+        """ Unpack a state packed by encode """
+
+        return tuple(record)
+
     def check_solvability(self, state):
-        """ Checks if the given state is solvable """
+        """ Checks if the given state is solvable. On boards of even width the
+        row of the blank, counted from the bottom, also matters.
+        >>> puzzle = FifteenPuzzle(tuple(range(1, 14)) + (15, 14, 0))
+        >>> puzzle.check_solvability(puzzle.initial)
+        False
+        >>> puzzle.check_solvability(tuple(range(1, 12)) + (0, 13, 14, 15, 12))
+        True
+        """
 
         inversion = 0
         for i in range(len(state)):
@@ -484,6 +903,8 @@ class EightPuzzle(Problem):
                 if (state[i] > state[j]) and state[i] != 0 and state[j] != 0:
                     inversion += 1
 
+        if self.n % 2 == 0:
+            inversion += self.n - self.find_blank_square(state) // self.n - 1
         return inversion % 2 == 0
 
     def h(self, node):
@@ -493,6 +914,138 @@ class EightPuzzle(Problem):
         return sum(s != g for (s, g) in zip(node.state, self.goal))
 
 
+class FifteenPuzzle(EightPuzzle):
+    """ The sliding-tile puzzle on a 4x4 board. Misplaced tiles is far too weak a
+    heuristic here; use astar_search(problem, pattern_database_heuristic(...)). """
+
+    def __init__(self, initial, goal=tuple(range(1, 16)) + (0,), hashing=False):
+        super().__init__(initial, goal, hashing)
+
+
+# ______________________________________________________________________________
+# Pattern databases for sliding-tile puzzles
+
+
+class PatternDatabase:
+    """An additive pattern database for the n x n sliding-tile puzzle. For one
+    group of tiles, table[i] holds the fewest moves of those tiles (moves of
+    all other tiles are free) needed to bring them from the placement with
+    index i to their places in goal. A placement is indexed in mixed radix,
+    sum(position(tile) * (n*n)**j for j, tile in enumerate(tiles)), so the
+    table is a flat uint8 array of (n*n)**len(tiles) entries. Because only the
+    group's own moves are counted, the values of databases for disjoint groups
+    of tiles can be added and still give an admissible heuristic.
+    The table is computed by a breadth-first search backward from the goal,
+    vectorized over whole layers with numpy. It needs (n*n)**(len(tiles)+1)
+    bytes of working memory, so groups of up to 5 or 6 tiles suit the
+    15-puzzle. Once saved, a table can be loaded memory-mapped read-only, so
+    many processes share one copy."""
+
+    def __init__(self, goal, tiles, table=None):
+        self.goal = tuple(goal)
+        self.tiles = tuple(tiles)
+        self.n = exact_sqrt(len(goal))
+        self.table = table
+        self.weights = [len(goal) ** j for j in range(len(tiles))]
+
+    def build(self):
+        """Fill in the table by 0-1 breadth-first search from the goal."""
+        n, N, k = self.n, self.n * self.n, len(self.tiles)
+        powers = N ** np.arange(k + 1, dtype=np.int64)
+        dist = np.full(N ** (k + 1), 255, dtype=np.uint8)
+        start = sum(self.goal.index(tile) * w for tile, w in zip(self.tiles, self.weights))
+        start += self.goal.index(0) * N ** k
+        layer, d = np.array([start], dtype=np.int64), 0
+        dist[start] = 0
+        while layer.size:
+            # States whose blank can wander over to another spot for free
+            # are at the same distance.
+            frontier = layer
+            while frontier.size:
+                free = self.successors(frontier, n, powers)[1]
+                free = np.unique(free[dist[free] == 255])
+                dist[free] = d
+                layer = np.concatenate([layer, free])
+                frontier = free
+            moved = self.successors(layer, n, powers)[0]
+            layer = np.unique(moved[dist[moved] == 255])
+            d += 1
+            dist[layer] = d
+        self.table = dist.reshape(N, N ** k).min(axis=0)
+        return self
+
+    @staticmethod
+    def successors(index, n, powers):
+        """Return the indexes reached by sliding a group tile into the blank,
+        and those reached by sliding any other tile into the blank."""
+        N, k = n * n, len(powers) - 1
+        where = (index[:, None] // powers) % N
+        blank = where[:, k]
+        moved, free = [], []
+        for delta, ok in ((-n, blank >= n), (n, blank < N - n),
+                          (-1, blank % n != 0), (1, blank % n != n - 1)):
+            b, base, tiles = blank[ok], index[ok], where[ok, :k]
+            hit = tiles == (b + delta)[:, None]
+            occupied = hit.any(axis=1)
+            base = base + delta * powers[k]
+            free.append(base[~occupied])
+            # the hit tile takes the blank's old place
+            moved.append(base[occupied] - delta * powers[hit[occupied].argmax(axis=1)])
+        return np.concatenate(moved), np.concatenate(free)
+
+    def save(self, file):
+        """Write the table to file as a .npy array."""
+        np.save(file, self.table)
+
+    def load(self, file):
+        """Read the table from file, memory-mapped read-only."""
+        self.table = np.load(file, mmap_mode='r')
+        assert self.table.shape == (len(self.goal) ** len(self.tiles),)
+        return self
+
+    def lookup(self, where):
+        """The table entry for a state given as where[tile] = position."""
+        return int(self.table[sum(where[tile] * w for tile, w in zip(self.tiles, self.weights))])
+
+
+def disjoint_pattern_databases(goal, partition, directory=None):
+    """Return a PatternDatabase for each group of tiles in partition, such as
+    [(1, 2, 3, 4), (5, 6, 7, 8)] for the 8-puzzle. If a directory is given,
+    tables already saved there are loaded memory-mapped, and tables that are
+    not there yet are built and saved, so the precomputation is done once.
+    >>> puzzle = EightPuzzle((2, 4, 3, 1, 5, 6, 7, 8, 0))
+    >>> pdbs = disjoint_pattern_databases(puzzle.goal, [(1, 2, 3, 4), (5, 6, 7, 8)])
+    >>> h = pattern_database_heuristic(pdbs)
+    >>> astar_search(puzzle, h).path_cost == astar_search(puzzle).path_cost
+    True
+    """
+    pdbs = []
+    for tiles in partition:
+        pdb = PatternDatabase(goal, tiles)
+        if directory is None:
+            pdbs.append(pdb.build())
+            continue
+        file = os.path.join(directory, 'pdb-{}-{}.npy'.format('_'.join(map(str, goal)),
+                                                              '_'.join(map(str, tiles))))
+        if not os.path.exists(file):
+            pdb.build().save(file)
+        pdbs.append(pdb.load(file))
+    return pdbs
+
+
+def pattern_database_heuristic(pdbs):
+    """Return an h(node) function for sliding-tile puzzles that adds up the
+    values of disjoint pattern databases."""
+
+    def h(node):
+        where = [0] * len(node.state)
+        for position, tile in enumerate(node.state):
+            where[tile] = position
+        return sum(pdb.lookup(where) for pdb in pdbs)
+
+    return h
+
+
 # ______________________________________________________________________________
 
 
@@ -632,6 +1185,215 @@ def recursive_best_first_search(problem, h=None):
     return result
 
 
+def ida_star_search(problem, h=None, table_size=0, stats=None, display=False):
+    """Iterative deepening A*: repeated depth-first searches, each cut off
+    where f = g + h exceeds a bound that starts at h(initial) and grows to
+    the smallest f that exceeded it in the previous iteration. Memory use is
+    linear in the solution depth. A child that just undoes its parent's move
+    (leads back to the parent's state) is never generated.
+    If table_size is nonzero, a transposition table of up to table_size
+    states remembers the lowest g each state was reached with, evicting the
+    least recently used entry when full; paths that reach a state at a higher
+    g are pruned. If a list is given as stats, a dict of statistics (bound,
+    expanded, generated, pruned) is appended to it for every iteration.
+    The depth-first search keeps its own stack, so deep solutions do not
+    run into Python's recursion limit:
+    >>> path = Graph({i: {i + 1: 1} for i in range(1500)})
+    >>> ida_star_search(GraphProblem(0, 1500, path), h=lambda n: 1500 - n.state).path_cost
+    1500
+    """
+    h = h or problem.h
+    table = collections.OrderedDict()
+
+    def search(root, bound, counts):
+        """Search depth-first from root, cutting off at bound. Return the goal
+        node and its f, or None and the smallest f that exceeded bound. Each
+        stack frame is [node, its actions not yet tried, smallest f so far
+        that exceeded bound below node]."""
+        f = root.path_cost + h(root)
+        if f > bound:
+            return None, f
+        if problem.goal_test(root.state):
+            return root, f
+        counts['expanded'] += 1
+        stack = [[root, iter(problem.actions(root.state)), np.inf]]
+        while stack:
+            frame = stack[-1]
+            node = frame[0]
+            for action in frame[1]:
+                child = node.child_node(problem, action)
+                counts['generated'] += 1
+                if node.parent is not None and child.state == node.parent.state:
+                    counts['pruned'] += 1
+                    continue
+                if table_size:
+                    best = table.get(child.state)
+                    if best is not None and best < child.path_cost:
+                        counts['pruned'] += 1
+                        continue
+                    table[child.state] = child.path_cost
+                    table.move_to_end(child.state)
+                    if len(table) > table_size:
+                        table.popitem(last=False)
+                f = child.path_cost + h(child)
+                if f > bound:
+                    frame[2] = min(frame[2], f)
+                    continue
+                if problem.goal_test(child.state):
+                    return child, f
+                counts['expanded'] += 1
+                stack.append([child, iter(problem.actions(child.state)), np.inf])
+                break
+            else:
+                stack.pop()
+                if not stack:
+                    return None, frame[2]
+                stack[-1][2] = min(stack[-1][2], frame[2])
+
+    node = Node(problem.initial)
+    table[node.state] = 0
+    bound = h(node)
+    while True:
+        counts = dict(bound=bound, expanded=0, generated=0, pruned=0)
+        result, bound = search(node, bound, counts)
+        if stats is not None:
+            stats.append(counts)
+        if display:
+            print("bound", counts['bound'], ":", counts['expanded'], "paths expanded,",
+                  counts['generated'], "generated,", counts['pruned'], "pruned")
+        if result is not None:
+            return result
+        if bound == np.inf:
+            return None
+
+
+def sma_star_search(problem, h=None, limit=1000, display=False):
+    """Simplified memory-bounded A* (SMA*): A* that never holds more than
+    limit nodes. It expands the deepest of the lowest-f nodes, generating
+    one successor at a time. When memory is full it evicts the shallowest
+    of the highest-f leaves and backs up the leaf's f-value to its parent,
+    which remembers it so the subtree can be regenerated later if it again
+    looks best. Once all of a node's successors have been generated, its f
+    becomes the lowest f of its children, remembered ones included. A
+    successor is skipped if its state is already in memory at no greater
+    path cost and depth, and one that would fill memory with its path but is not a
+    goal gets f = infinity. Returns the cheapest goal node whose path fits
+    in limit nodes (optimal if limit allows), or None if there is none.
+    Wrap the problem in InstrumentedProblem(problem, track_reexpansions=True)
+    to count re-expansions.
+    >>> romania = GraphProblem('Arad', 'Bucharest', romania_map)
+    >>> sma_star_search(romania).path_cost == astar_search(romania).path_cost == 418
+    True
+
+    The cheapest path, through Rimnicu and Pitesti, takes 5 nodes; with room
+    for only 4, the best path is the one through Fagaras, and with 3 there is
+    none:
+    >>> sma_star_search(romania, limit=4).solution()
+    ['Sibiu', 'Fagaras', 'Bucharest']
+    >>> sma_star_search(romania, limit=3) is None
+    True
+
+    A node cut off at the depth limit does not hide a shallower path to the
+    same state:
+    >>> g = UndirectedGraph({0: {1: 2, 6: 6}, 1: {4: 7, 5: 3, 6: 3}, 6: {5: 4, 7: 7}})
+    >>> sma_star_search(GraphProblem(0, 7, g), h=lambda n: 0, limit=3).solution()
+    [6, 7]
+    """
+    if limit < 2:
+        raise ValueError("SMA* needs room for at least two nodes", limit)
+    h = memoize(h or problem.h, 'h')
+
+    class SMANode(Node):
+        __slots__ = ('goal', 'untried', 'children', 'forgotten')
+        __eq__, __hash__ = object.__eq__, object.__hash__  # nodes, not states
+
+    def make_node(state, parent=None, action=None, path_cost=0):
+        node = SMANode(state, parent, action, path_cost)
+        node.goal = problem.goal_test(state)
+        node.untried = None  # actions not generated yet, once expanded
+        node.children = {}  # action -> child in memory
+        node.forgotten = {}  # action -> backed-up f of an evicted child
+        return node
+
+    def backup(node):
+        """Raise f for node and its ancestors to the lowest f of their children."""
+        while node is not None and node.untried is not None and not node.untried:
+            f = max(node.f, min(chain((c.f for c in node.children.values()),
+                                      node.forgotten.values()), default=np.inf))
+            if f == node.f:
+                return
+            node.f = f
+            for queue in (frontier, leaves):
+                if node in queue:
+                    queue.append(node)
+            node = node.parent
+
+    frontier = IndexedPriorityQueue('min', lambda n: (n.f, -n.depth))  # deepest lowest-f first
+    leaves = IndexedPriorityQueue('min', lambda n: (-n.f, n.depth))  # shallowest highest-f first
+    root = make_node(problem.initial)
+    root.f = h(root)
+    frontier.append(root)
+    in_memory = {root.state: root}  # the cheapest node in memory for each state
+    used, evicted = 1, 0
+    while frontier:
+        node = frontier.heap[0][1]
+        if node.f == np.inf:
+            break
+        if node.goal:
+            if display:
+                print(used, "nodes in memory;", evicted, "evicted")
+            return node
+        if node.untried is None:
+            node.untried = deque(problem.actions(node.state))
+        if node.untried:
+            action, remembered = node.untried.popleft(), 0
+        elif node.forgotten:
+            action = min(node.forgotten, key=node.forgotten.get)
+            remembered = node.forgotten.pop(action)
+        else:  # a dead end
+            del frontier[node]
+            backup(node)
+            continue
+        state = problem.result(node.state, action)
+        path_cost = problem.path_cost(node.path_cost, node.state, action, state)
+        child, other = None, in_memory.get(state)
+        # only a node in memory that is no dearer and no deeper makes this one redundant
+        if other is None or path_cost < other.path_cost or node.depth + 1 < other.depth:
+            child = in_memory[state] = make_node(state, node, action, path_cost)
+            child.f = max(node.f, child.path_cost + h(child), remembered)
+            if not child.goal and child.depth >= limit - 1:
+                child.f = np.inf
+            node.children[action] = child
+            if node in leaves:
+                del leaves[node]
+        if not node.untried:
+            if not node.forgotten:
+                del frontier[node]
+            backup(node)
+        if child is None:
+            continue
+        used += 1
+        if used > limit:
+            worst = leaves.pop()
+            parent = worst.parent
+            del parent.children[worst.action]
+            parent.forgotten[worst.action] = worst.f
+            if worst in frontier:
+                del frontier[worst]
+            if in_memory.get(worst.state) is worst:
+                del in_memory[worst.state]
+            frontier.append(parent)
+            if not parent.children and parent is not root:
+                leaves.append(parent)
+            used -= 1
+            evicted += 1
+        frontier.append(child)
+        leaves.append(child)
+    if display:
+        print(used, "nodes in memory;", evicted, "evicted; no solution within the limit")
+    return None
+
+
 def hill_climbing(problem):
     """
     [Figure 4.2]
@@ -651,8 +1413,15 @@ def hill_climbing(problem):
 
 
 def exp_schedule(k=20, lam=0.005, limit=100):
-    """One possible schedule function for simulated annealing"""
-    return lambda t: (k * np.exp(-lam * t) if t < limit else 0)
+    """One possible schedule function for simulated annealing. It is a
+    partial application of exp_temperature rather than a lambda so that it
+    can be sent to other processes."""
+    return functools.partial(exp_temperature, k, lam, limit)
+
+
+def exp_temperature(k, lam, limit, t):
+    """The temperature at time t under exp_schedule(k, lam, limit)."""
+    return k * np.exp(-lam * t) if t < limit else 0
 
 
 def simulated_annealing(problem, schedule=exp_schedule()):
@@ -691,6 +1460,125 @@ def simulated_annealing_full(problem, schedule=exp_schedule()):
             current = next_choice
 
 
+def annealing_step(problem, state, value, T, rng):
+    """One move of simulated annealing at temperature T: a random neighbor of
+    state (whose value is value) is accepted if it is better, or else with
+    probability exp(delta_e / T). Returns the new (state, value)."""
+    actions = problem.actions(state)
+    if not actions:
+        return state, value
+    next_state = problem.result(state, rng.choice(actions))
+    next_value = problem.value(next_state)
+    delta_e = next_value - value
+    if delta_e > 0 or (T > 0 and rng.random() < np.exp(delta_e / T)):
+        return next_state, next_value
+    return state, value
+
+
+def annealing_chain(problem, schedule, seed, restart=None):
+    """Run one chain of parallel_simulated_annealing with its own random
+    number generator. Returns the best state seen and the trace of values."""
+    rng = random.Random(seed)
+    state = restart(rng) if restart else problem.initial
+    value = problem.value(state)
+    best, best_value, trace = state, value, [value]
+    for t in range(sys.maxsize):
+        T = schedule(t)
+        if T == 0:
+            break
+        state, value = annealing_step(problem, state, value, T, rng)
+        trace.append(value)
+        if value > best_value:
+            best, best_value = state, value
+    return best, trace
+
+
+def parallel_simulated_annealing(problem, chains=4, schedule=exp_schedule(), restart=None,
+                                 processes=None, seed=None):
+    """Run chains independent simulated annealing chains on a pool of
+    processes (default: one per CPU). Each chain gets its own random number
+    stream, spawned from seed. restart, if given, is a function of a
+    random.Random that returns a random initial state, making this random-
+    restart annealing; otherwise every chain starts from problem.initial.
+    The problem, schedule and restart must be picklable. Returns the best
+    state found and a list, per chain, of the values it went through."""
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(chains)]
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(annealing_chain, [(problem, schedule, s, restart) for s in seeds])
+    best = max((state for state, trace in results), key=problem.value)
+    return best, [trace for state, trace in results]
+
+
+def parallel_tempering(problem, temperatures=(30, 10, 3, 1, 0.3), steps=1000, exchange_interval=10,
+                       restart=None, seed=None):
+    """Replica exchange: one chain per temperature, each on a process of its
+    own, runs annealing moves at its fixed temperature. Every
+    exchange_interval moves, chains at neighboring temperatures (alternately
+    the even and the odd pairs) propose to swap states, and do so with
+    probability min(1, exp((v_j - v_i) * (1/T_i - 1/T_j))), so good states
+    drift down to the cold chains while the hot ones keep exploring.
+    restart and seed are as for parallel_simulated_annealing. Returns the
+    best state found and a list, per temperature, of the values it went
+    through."""
+    seeds = [int(s.generate_state(1)[0])
+             for s in np.random.SeedSequence(seed).spawn(len(temperatures) + 1)]
+    rng = random.Random(seeds.pop())
+    states = [restart(rng) if restart else problem.initial for T in temperatures]
+    connections, workers = [], []
+    for T, s in zip(temperatures, seeds):
+        conn, worker_conn = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=tempering_chain, args=(worker_conn, problem, T, s))
+        worker.start()
+        connections.append(conn)
+        workers.append(worker)
+
+    best, best_value = None, -np.inf
+    traces = [[] for T in temperatures]
+    try:
+        for r, start in enumerate(range(0, steps, exchange_interval)):
+            for conn, state in zip(connections, states):
+                conn.send((state, min(exchange_interval, steps - start)))
+            results = [conn.recv() for conn in connections]
+            states = [state for state, value, top, top_value, trace in results]
+            values = [value for state, value, top, top_value, trace in results]
+            for (state, value, top, top_value, trace), chain_trace in zip(results, traces):
+                chain_trace.extend(trace)
+                if top_value > best_value:
+                    best, best_value = top, top_value
+            for i in range(r % 2, len(temperatures) - 1, 2):
+                a = (values[i + 1] - values[i]) * (1 / temperatures[i] - 1 / temperatures[i + 1])
+                if a >= 0 or rng.random() < np.exp(a):
+                    states[i], states[i + 1] = states[i + 1], states[i]
+                    values[i], values[i + 1] = values[i + 1], values[i]
+    finally:
+        for conn, worker in zip(connections, workers):
+            conn.send(None)
+            worker.join()
+    return best, traces
+
+
+def tempering_chain(conn, problem, T, seed):
+    """Run one chain of parallel_tempering at temperature T. Each message on
+    conn is (state, steps): the chain makes steps moves from state and sends
+    back (state, value, best state, best value, trace of values). A message
+    of None ends it."""
+    rng = random.Random(seed)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        state, steps = message
+        value = problem.value(state)
+        best, best_value, trace = state, value, []
+        for i in range(steps):
+            state, value = annealing_step(problem, state, value, T, rng)
+            trace.append(value)
+            if value > best_value:
+                best, best_value = state, value
+        conn.send((state, value, best, best_value, trace))
+    conn.close()
+
+
 def and_or_graph_search(problem):
     """[Figure 4.11]Used when the environment is nondeterministic and completely observable.
     Contains OR nodes where the agent is free to choose any action.
@@ -908,18 +1796,111 @@ class LRTAStarAgent:
 # Genetic Algorithm
 
 
-def genetic_search(problem, ngen=1000, pmut=0.1, n=20):
+def genetic_search(problem, ngen=1000, pmut=0.1, n=20, gene_pool=[0, 1]):
     """Call genetic_algorithm on the appropriate parts of a problem.
     This requires the problem to have states that can mate and mutate,
-    plus a value method that scores states."""
+    plus a value method that scores states. See island_genetic_search
+    for a version that runs several populations on several processes.
+    >>> class OneMax(Problem):
+    ...     def actions(self, state): return range(len(state))
+    ...     def result(self, state, i): return state[:i] + [1 - state[i]] + state[i + 1:]
+    ...     def value(self, state): return sum(state)
+    >>> best = genetic_search(OneMax([0] * 8), ngen=20, pmut=0.5)
+    >>> len(best), set(best) <= {0, 1}
+    (8, True)
+    """
 
-    # NOTE: This is not tested and might not work.
     # TODO: Use this function to make Problems work with genetic_algorithm.
 
-    s = problem.initial_state
+    s = problem.initial
     states = [problem.result(s, a) for a in problem.actions(s)]
     random.shuffle(states)
-    return genetic_algorithm(states[:n], problem.value, ngen, pmut)
+    return genetic_algorithm(states[:n], problem.value, gene_pool, ngen=ngen, pmut=pmut)
+
+
+def island_genetic_search(problem, ngen=1000, pmut=0.1, n=20, gene_pool=[0, 1], f_thres=None,
+                          islands=4, migration_interval=50, migrants=2, topology='ring'):
+    """Island-model genetic search: like genetic_search, but islands separate
+    populations of n individuals each evolve on processes of their own. Every
+    migration_interval generations, each island sends copies of its best
+    migrants individuals to the islands it is linked to, where they replace
+    the worst individuals. topology is 'ring' (island i sends to island i+1),
+    'complete' (every island sends to every other), or a dict mapping each
+    island number to a list of the island numbers it sends to.
+    Stops after ngen generations, or after the first migration at which some
+    island holds an individual with fitness at least f_thres, and returns the
+    fittest individual found. With migrants=0 the islands evolve apart:
+    >>> class OneMax(Problem):
+    ...     def actions(self, state): return range(len(state))
+    ...     def result(self, state, i): return state[:i] + [1 - state[i]] + state[i + 1:]
+    ...     def value(self, state): return sum(state)
+    >>> best = island_genetic_search(OneMax([0] * 8), ngen=20, f_thres=8, islands=2,
+    ...                              migration_interval=10, migrants=0)
+    >>> len(best), set(best) <= {0, 1}
+    (8, True)
+    """
+    if topology == 'ring':
+        topology = {i: [(i + 1) % islands] for i in range(islands)}
+    elif topology == 'complete':
+        topology = {i: [j for j in range(islands) if j != i] for i in range(islands)}
+
+    s = problem.initial
+    states = [problem.result(s, a) for a in problem.actions(s)]
+    connections, workers = [], []
+    for i in range(islands):
+        conn, worker_conn = multiprocessing.Pipe()
+        population = random.sample(states, min(n, len(states)))
+        worker = multiprocessing.Process(target=genetic_island,
+                                         args=(worker_conn, population, problem.value, gene_pool,
+                                               pmut, random.randrange(2 ** 32)))
+        worker.start()
+        connections.append(conn)
+        workers.append(worker)
+
+    best = None
+    immigrants = [[] for i in range(islands)]
+    try:
+        for generation in range(0, ngen, migration_interval):
+            for conn, arrivals in zip(connections, immigrants):
+                conn.send((arrivals, min(migration_interval, ngen - generation), migrants))
+            emigrants = [conn.recv() for conn in connections]
+            for e in emigrants:
+                if e and (best is None or problem.value(e[0]) > problem.value(best)):
+                    best = e[0]
+            if f_thres is not None and problem.value(best) >= f_thres:
+                break
+            immigrants = [[] for i in range(islands)]
+            for i, links in topology.items():
+                for j in links:
+                    immigrants[j].extend(emigrants[i][:migrants])
+    finally:
+        for conn, worker in zip(connections, workers):
+            conn.send(None)
+            worker.join()
+    return best
+
+
+def genetic_island(conn, population, fitness_fn, gene_pool, pmut, seed):
+    """Evolve one population of island_genetic_search. Each message on conn is
+    (immigrants, ngen, migrants): the immigrants replace the worst individuals,
+    the population evolves for ngen generations, and the best migrants
+    individuals (at least one, so the best is known even with migrants=0)
+    are sent back, fittest first. A message of None ends it."""
+    random.seed(seed)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        immigrants, ngen, migrants = message
+        if immigrants:
+            population.sort(key=fitness_fn)
+            population[:len(immigrants)] = immigrants[:len(population)]
+        for i in range(ngen):
+            population = [mutate(recombine(*select(2, population, fitness_fn)), gene_pool, pmut)
+                          for i in range(len(population))]
+        population.sort(key=fitness_fn, reverse=True)
+        conn.send(population[:max(migrants, 1)])
+    conn.close()
 
 
 def genetic_algorithm(population, fitness_fn, gene_pool=[0, 1], f_thres=None, ngen=1000, pmut=0.1):
@@ -996,6 +1977,81 @@ def mutate(x, gene_pool, pmut):
     return x[:c] + [new_gene] + x[c + 1:]
 
 
+# The same genetic algorithm with the whole population held in one 2-D numpy
+# array (one row per individual), so that each generation is a handful of
+# array operations instead of a Python loop over individuals. Here fitness_fn
+# takes the population array and returns an array with one fitness per row.
+
+
+def genetic_algorithm_vectorized(population, fitness_fn, gene_pool=[0, 1], f_thres=None,
+                                 ngen=1000, pmut=0.1, seed=None):
+    """[Figure 4.8] Like genetic_algorithm, but population is a 2-D array (or
+    anything np.asarray turns into one) and fitness_fn is evaluated on the
+    whole population at once. Returns the fittest individual as a 1-D array.
+    To reuse a fitness function written for one individual (as a list), pass
+    lambda pop: np.array([fitness(list(x)) for x in pop]), or just call
+    genetic_algorithm.
+    >>> population = np.random.default_rng(0).integers(0, 2, size=(20, 10))
+    >>> onemax = lambda pop: pop.sum(axis=1)
+    >>> genetic_algorithm_vectorized(population, onemax, f_thres=10, ngen=500, seed=1).tolist()
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    """
+    rng = np.random.default_rng(seed)
+    population = np.asarray(population)
+    gene_pool = np.asarray(gene_pool)
+    fitness = np.asarray(fitness_fn(population), dtype=float)
+    for i in range(ngen):
+        parents = select_vectorized(len(population), population, fitness, rng)
+        population = mutate_vectorized(recombine_vectorized(*parents, rng), gene_pool, pmut, rng)
+        fitness = np.asarray(fitness_fn(population), dtype=float)
+        if f_thres is not None and fitness.max() >= f_thres:
+            break
+
+    return population[fitness.argmax()]
+
+
+def select_vectorized(r, population, fitness, rng):
+    """Pick two arrays of r parents each, with probability proportional to
+    fitness (uniformly if no individual has positive fitness).
+    >>> population, fitness = np.array([[0], [1]]), np.array([0., 1.])
+    >>> x, y = select_vectorized(5, population, fitness, np.random.default_rng(0))
+    >>> x.ravel().tolist(), y.ravel().tolist()
+    ([1, 1, 1, 1, 1], [1, 1, 1, 1, 1])
+    """
+    total = fitness.sum()
+    p = fitness / total if total > 0 else None
+    choices = rng.choice(len(population), size=(2, r), p=p)
+    return population[choices[0]], population[choices[1]]
+
+
+def recombine_vectorized(x, y, rng):
+    """Row-wise one-point crossover: row i of the result is x[i][:c] + y[i][c:]
+    for a random c chosen separately for each row.
+    >>> x, y = np.zeros((2, 4), dtype=int), np.ones((2, 4), dtype=int)
+    >>> child = recombine_vectorized(x, y, np.random.default_rng(2))
+    >>> child.tolist(), bool((np.diff(child) >= 0).all())
+    ([[0, 0, 0, 1], [0, 1, 1, 1]], True)
+    """
+    n, length = x.shape
+    c = rng.integers(0, length, size=n)
+    return np.where(np.arange(length) < c[:, None], x, y)
+
+
+def mutate_vectorized(x, gene_pool, pmut, rng):
+    """With probability pmut, set one random gene of each row (in place) to a
+    random value from gene_pool.
+    >>> x = np.zeros((3, 4), dtype=int)
+    >>> x = mutate_vectorized(x, np.array([1]), 1.0, np.random.default_rng(0))
+    >>> x.sum(axis=1).tolist()
+    [1, 1, 1]
+    """
+    n, length = x.shape
+    rows = np.flatnonzero(rng.random(n) < pmut)
+    genes = gene_pool[rng.integers(0, len(gene_pool), size=len(rows))]
+    x[rows, rng.integers(0, length, size=len(rows))] = genes
+    return x
+
+
 # _____________________________________________________________________________
 # The remainder of this file implements examples for the search algorithms.
 
@@ -1063,6 +2119,154 @@ def UndirectedGraph(graph_dict=None):
     return Graph(graph_dict=graph_dict, directed=False)
 
 
+class CSRGraph:
+    """A frozen graph stored in compressed sparse row form, for graphs too big
+    for the dict of dicts in Graph. Nodes are interned: node i has the name
+    names[i] and index[names[i]] == i. The links out of node i are
+    targets[offsets[i]:offsets[i + 1]] (sorted node indexes) with lengths
+    weights[offsets[i]:offsets[i + 1]]; these are numpy arrays. Lengths must
+    be numbers, and node names numbers or strings.
+    A CSRGraph answers get, nodes, directed, locations and graph_dict like a
+    Graph does, so GraphProblem and the searches use it unchanged, but no
+    links can be added. Build one from (A, B, distance) triples with
+        g = CSRGraph([('A', 'B', 1), ('A', 'C', 2)], directed=False)
+    from a Graph with freeze_graph, or from a file with load_csr_graph.
+    As with Graph.connect, a link given twice takes its last length, in both
+    directions if the graph is undirected:
+    >>> g = CSRGraph([('A', 'B', 1), ('B', 'A', 2)], directed=False)
+    >>> g.get('A'), g.get('B')
+    ({'B': 2}, {'A': 2})
+    """
+
+    def __init__(self, edges=(), directed=True, locations=None, names=None):
+        self.names = list(names or [])
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.directed = directed
+        if locations is not None:
+            self.locations = locations
+        sources, targets, weights = [], [], []
+        for (a, b, distance) in edges:
+            sources.append(self.intern(a))
+            targets.append(self.intern(b))
+            weights.append(distance)
+        sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+        weights = np.array(weights) if weights else np.zeros(0)
+        sequence = np.arange(len(sources))
+        if not directed:
+            sources, targets = (np.concatenate([sources, targets]),
+                                np.concatenate([targets, sources]))
+            weights = np.concatenate([weights, weights])
+            sequence = np.concatenate([sequence, sequence])
+        # Sort the links by (source, target); of repeated links, the last given wins.
+        order = np.lexsort((sequence, targets, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+        last = np.ones(len(sources), dtype=bool)
+        last[:-1] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        self.targets, self.weights = targets[last], weights[last]
+        self.offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[last], minlength=len(self.names)), out=self.offsets[1:])
+
+    def intern(self, name):
+        """Return the index of the node called name, adding it if it is new."""
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def get(self, a, b=None):
+        """Return a link distance or a dict of {node: distance} entries.
+        .get(a,b) returns the distance or None;
+        .get(a) returns a dict of {node: distance} entries, possibly {}."""
+        i = self.index.get(a)
+        if i is None:
+            return {} if b is None else None
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        if b is None:
+            names = self.names
+            return {names[j]: d
+                    for j, d in zip(self.targets[lo:hi].tolist(), self.weights[lo:hi].tolist())}
+        j = self.index.get(b)
+        k = lo + np.searchsorted(self.targets[lo:hi], j) if j is not None else hi
+        return self.weights[k].item() if k < hi and self.targets[k] == j else None
+
+    def nodes(self):
+        """Return a list of nodes in the graph."""
+        return list(self.names)
+
+    @property
+    def graph_dict(self):
+        """A read-only {node: {node: distance}} view of the links."""
+        return CSRGraphDict(self)
+
+    def save(self, file):
+        """Save the graph to file in numpy .npz format; see load_csr_graph.
+        Names of more than one type are saved as an object array, which
+        numpy pickles, rather than all being turned into strings:
+        >>> import tempfile, os
+        >>> with tempfile.TemporaryDirectory() as tmp:
+        ...     CSRGraph([(1, 'x', 2)]).save(os.path.join(tmp, 'g.npz'))
+        ...     load_csr_graph(os.path.join(tmp, 'g.npz')).get(1)
+        {'x': 2}
+        """
+        names = np.array(self.names)
+        if names.tolist() != self.names:
+            names = np.array(self.names, dtype=object)
+        arrays = dict(names=names, offsets=self.offsets, targets=self.targets,
+                      weights=self.weights, directed=np.array(self.directed))
+        if getattr(self, 'locations', None):
+            arrays['locations'] = np.array([self.locations[name] for name in self.names])
+        np.savez(file, **arrays)
+
+
+class CSRGraphDict(collections.abc.Mapping):
+    """The graph_dict of a CSRGraph: maps each node to a dict of its links."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, a):
+        if a not in self.graph.index:
+            raise KeyError(a)
+        return self.graph.get(a)
+
+    def __iter__(self):
+        return iter(self.graph.names)
+
+    def __len__(self):
+        return len(self.graph.names)
+
+
+def freeze_graph(graph):
+    """Return a CSRGraph with the same nodes, links and locations as graph."""
+    csr = CSRGraph(((a, b, distance) for a, links in graph.graph_dict.items()
+                    for b, distance in links.items()),
+                   locations=getattr(graph, 'locations', None), names=graph.nodes())
+    csr.directed = graph.directed  # an undirected Graph already holds both directions
+    return csr
+
+
+def load_csr_graph(file, directed=True):
+    """Load a CSRGraph from a .npz file written by CSRGraph.save, or else from
+    a text file with one link per line, 'A B distance' (distance defaults to
+    1), in which case directed says whether to add the inverse links too.
+    A .npz file may hold pickled names (see CSRGraph.save), so load only
+    files you trust."""
+    if str(file).endswith('.npz'):
+        with np.load(file, allow_pickle=True) as data:
+            csr = CSRGraph(directed=bool(data['directed']), names=data['names'].tolist())
+            csr.offsets, csr.targets = data['offsets'], data['targets']
+            csr.weights = data['weights']
+            if 'locations' in data:
+                csr.locations = dict(zip(csr.names, map(tuple, data['locations'].tolist())))
+        return csr
+    with open(file) as f:
+        edges = [(num_or_str(a), num_or_str(b), num_or_str(d[0]) if d else 1)
+                 for a, b, *d in (line.split() for line in f
+                                  if line.strip() and not line.startswith('#'))]
+    return CSRGraph(edges, directed)
+
+
 def RandomGraph(nodes=list(range(10)), min_links=2, width=400, height=300,
                 curvature=lambda: random.uniform(1.1, 1.5)):
     """Construct a random graph, with the specified nodes, and random links.
@@ -1070,26 +2274,62 @@ def RandomGraph(nodes=list(range(10)), min_links=2, width=400, height=300,
     Then each node is connected to the min_links nearest neighbors.
     Because inverse links are added, some nodes will have more connections.
     The distance between nodes is the hypotenuse times curvature(),
-    where curvature() defaults to a random number between 1.1 and 1.5."""
+    where curvature() defaults to a random number between 1.1 and 1.5.
+    Locations are drawn with numpy (seeded from the random module), and
+    nearest neighbors are found through a grid of buckets holding about two
+    nodes each, searched in growing rings around a node, so the time taken
+    grows about linearly with the number of nodes."""
+    nodes = list(nodes)
     g = UndirectedGraph()
-    g.locations = {}
-    # Build the cities
-    for node in nodes:
-        g.locations[node] = (random.randrange(width), random.randrange(height))
+    rng = np.random.default_rng(random.getrandbits(64))
+    xs, ys = rng.integers(width, size=len(nodes)), rng.integers(height, size=len(nodes))
+    g.locations = dict(zip(nodes, zip(xs.tolist(), ys.tolist())))
+    if not nodes:
+        return g
+    # Bucket the cities: the nodes in cell (a, b) are order[starts[c]:starts[c + 1]],
+    # where c = a * rows + b
+    size = max(1.0, np.sqrt(2 * width * height / len(nodes)))
+    columns, rows = int(width // size) + 1, int(height // size) + 1
+    cx, cy = (xs // size).astype(int), (ys // size).astype(int)
+    cells = cx * rows + cy
+    order = np.argsort(cells, kind='stable')
+    starts = np.searchsorted(cells[order], np.arange(columns * rows + 1)).tolist()
+    order, xs, ys, cx, cy = order.tolist(), xs.tolist(), ys.tolist(), cx.tolist(), cy.tolist()
+
+    def ring(a, b, r):
+        """The cells r steps (in the max norm) from cell (a, b)."""
+        if r == 0:
+            return [(a, b)]
+        return ([(i, j) for i in range(a - r, a + r + 1) for j in (b - r, b + r)] +
+                [(i, j) for i in (a - r, a + r) for j in range(b - r + 1, b + r)])
+
+    def nearest(i, links):
+        """The index of, and squared distance to, the nearest node that is
+        neither node i nor in links; ties go to the earliest node."""
+        x, y = xs[i], ys[i]
+        best, best_d2 = None, np.inf  # compare exact squared distances
+        for r in range(max(columns, rows)):
+            for a, b in ring(cx[i], cy[i], r):
+                if 0 <= a < columns and 0 <= b < rows:
+                    c = a * rows + b
+                    for j in order[starts[c]:starts[c + 1]]:
+                        if j != i and nodes[j] not in links:
+                            d2 = (xs[j] - x) ** 2 + (ys[j] - y) ** 2
+                            if d2 < best_d2 or (d2 == best_d2 and j < best):
+                                best, best_d2 = j, d2
+            if best_d2 <= (r * size) ** 2:  # every node in a further ring is farther than r * size
+                break
+        return best, best_d2
+
     # Build roads from each city to at least min_links nearest neighbors.
-    for i in range(min_links):
-        for node in nodes:
-            if len(g.get(node)) < min_links:
-                here = g.locations[node]
-
-                def distance_to_node(n):
-                    if n is node or g.get(node, n):
-                        return np.inf
-                    return distance(g.locations[n], here)
-
-                neighbor = min(nodes, key=distance_to_node)
-                d = distance(g.locations[neighbor], here) * curvature()
-                g.connect(node, neighbor, int(d))
+    for _ in range(min_links):
+        for i, node in enumerate(nodes):
+            links = g.get(node)
+            if len(links) < min_links:
+                j, d2 = nearest(i, links)
+                if j is not None:
+                    d = distance(g.locations[nodes[j]], g.locations[node]) * curvature()
+                    g.connect(node, nodes[j], int(d))
     return g
 
 
@@ -1182,6 +2422,7 @@ class GraphProblem(Problem):
     def __init__(self, initial, goal, graph):
         super().__init__(initial, goal)
         self.graph = graph
+        self.predecessors = None
 
     def actions(self, A):
         """The actions at a graph node are just its neighbors."""
@@ -1191,6 +2432,20 @@ class GraphProblem(Problem):
         """The result of going to a neighbor is just that neighbor."""
         return action
 
+    def reverse_actions(self, B):
+        """The actions that lead back from a graph node are its predecessors.
+        For a directed graph the predecessor lists are built on first use."""
+        if not self.graph.directed:
+            return self.actions(B)
+        if self.predecessors is None:
+            self.predecessors = multimap((C, A) for A, links in self.graph.graph_dict.items()
+                                         for C in links)
+        return self.predecessors.get(B, [])
+
+    def reverse_result(self, state, action):
+        """The result of going back to a predecessor is just that predecessor."""
+        return action
+
     def path_cost(self, cost_so_far, A, action, B):
         return cost_so_far + (self.graph.get(A, B) or np.inf)
 
@@ -1198,19 +2453,31 @@ class GraphProblem(Problem):
         """Find minimum value of edges."""
         m = np.inf
         for d in self.graph.graph_dict.values():
-            local_min = min(d.values())
+            local_min = min(d.values(), default=np.inf)
             m = min(m, local_min)
 
         return m
 
     def h(self, node):
-        """h function is straight-line distance from a node's state to goal."""
+        """h function is straight-line distance from a node's state to goal.
+        If the graph has a LandmarkTable as graph.landmarks, the larger of that
+        and the landmark lower bound is used."""
+        return self.estimate(node.state if isinstance(node, Node) else node, self.goal)
+
+    def reverse_h(self, node):
+        """reverse_h is the same estimate of the distance from the initial state
+        to a node's state; it is the heuristic for a search backward from the goal."""
+        return self.estimate(self.initial, node.state if isinstance(node, Node) else node)
+
+    def estimate(self, A, B):
+        """An admissible estimate of the distance from A to B."""
         locs = getattr(self.graph, 'locations', None)
+        landmarks = getattr(self.graph, 'landmarks', None)
+        if landmarks is not None:
+            bound = landmarks.bound(A, B)
+            return max(bound, int(distance(locs[A], locs[B]))) if locs else bound
         if locs:
-            if type(node) is str:
-                return int(distance(locs[node], locs[self.goal]))
-
-            return int(distance(locs[node.state], locs[self.goal]))
+            return int(distance(locs[A], locs[B]))
         else:
             return np.inf
 
@@ -1231,6 +2498,340 @@ class GraphProblemStochastic(GraphProblem):
         raise NotImplementedError
 
 
+# ______________________________________________________________________________
+# Landmark (ALT) heuristics for graphs
+
+
+class LandmarkTable:
+    """Lower bounds on graph distances from the triangle inequality with a few
+    landmark nodes (the ALT method: A*, Landmarks, Triangle inequality). For
+    any landmark L, d(A, B) >= d(L, B) - d(L, A) and d(A, B) >= d(A, L) - d(B, L).
+    table[0, l, i] holds the distance from landmark l to node i and, for a
+    directed graph, table[1, l, i] the distance from node i to landmark l.
+    Nodes are numbered in the order of self.names. Distances are computed
+    by Dijkstra's algorithm from each landmark.
+    Once built, a table can be saved and loaded memory-mapped, like a
+    PatternDatabase. Set graph.landmarks to a LandmarkTable and
+    GraphProblem.h will use it (graphs need no locations then):
+        romania_map.landmarks = LandmarkTable(romania_map).build(4)"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.names = list(getattr(graph, 'names', None) or sorted(graph.nodes(), key=repr))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.landmarks = []
+        self.table = None
+
+    def build(self, k=8, strategy='farthest'):
+        """Choose k landmarks and compute the table. The 'farthest' strategy
+        picks each landmark as far as possible from the ones already chosen;
+        'avoid' picks a leaf of a shortest-path tree from a random node, in the
+        region where the current bounds are worst."""
+        n = len(self.names)
+        directed = self.graph.directed
+        reverse = multimap((b, (a, d)) for a, links in self.graph.graph_dict.items()
+                           for b, d in links.items()) if directed else None
+        self.table = np.zeros((2 if directed else 1, 0, n))
+        self.landmarks = []
+        for l in range(min(k, n)):
+            if strategy == 'farthest':
+                landmark = self.farthest_node()
+            elif strategy == 'avoid':
+                landmark = self.avoid_node()
+                if landmark in self.landmarks:
+                    landmark = self.farthest_node()
+            else:
+                raise ValueError("Strategy must be either 'farthest' or 'avoid'.")
+            rows = [self.dijkstra(landmark, self.graph.get)[0]]
+            if directed:
+                rows.append(self.dijkstra(landmark, lambda b: dict(reverse.get(b, [])))[0])
+            self.table = np.concatenate([self.table, np.array(rows)[:, None, :]], axis=1)
+            self.landmarks.append(landmark)
+        return self
+
+    def farthest_node(self):
+        """The node with the greatest finite distance to its nearest landmark
+        (or a random node if there are no landmarks yet)."""
+        if not self.landmarks:
+            return random.choice(self.names)
+        nearest = self.table[0].min(axis=0)
+        nearest[np.isinf(nearest)] = -1
+        nearest[[self.index[l] for l in self.landmarks]] = -2
+        return self.names[int(nearest.argmax())]
+
+    def avoid_node(self):
+        """The 'avoid' landmark choice of Goldberg and Harrelson: grow a
+        shortest-path tree from a random root; weigh each node by how much
+        its true distance from the root exceeds the current lower bound; give
+        subtrees that contain a landmark size 0; then walk down from the root
+        into the heaviest subtree until reaching a leaf."""
+        root = random.choice(self.names)
+        dist, parent, order = self.dijkstra(root, self.graph.get)
+        r = self.index[root]
+        bound = self.bounds_from(r) if self.landmarks else np.zeros(len(self.names))
+        weight = np.zeros(len(self.names))
+        reached = np.isfinite(dist)
+        weight[reached] = dist[reached] - bound[reached]
+        size = dict.fromkeys(order, 0.0)
+        children = multimap((parent[v], v) for v in order if parent[v] >= 0)
+        marked = {self.index[l] for l in self.landmarks}
+        for v in reversed(order):
+            if v in marked:
+                size[v] = 0
+                if parent[v] >= 0:
+                    marked.add(parent[v])
+            else:
+                size[v] += weight[v]
+            if parent[v] >= 0 and v not in marked:
+                size[parent[v]] += size[v]
+        v = r
+        while children.get(v):
+            v = max(children[v], key=lambda c: size[c])
+        return self.names[v]
+
+    def dijkstra(self, source, links):
+        """Distances from source, as an array indexed like self.names (np.inf if
+        unreachable), together with an array of each node's parent in the
+        shortest-path tree (-1 for none) and the nodes in the order reached.
+        links(a) gives the {node: distance} links to follow out of a."""
+        index = self.index
+        dist = np.full(len(self.names), np.inf)
+        parent = np.full(len(self.names), -1)
+        s = index[source]
+        dist[s] = 0
+        frontier, order = [(0, s)], []
+        while frontier:
+            d, i = heapq.heappop(frontier)
+            if d > dist[i]:
+                continue
+            order.append(i)
+            for b, length in links(self.names[i]).items():
+                j = index[b]
+                if d + length < dist[j]:
+                    dist[j] = d + length
+                    parent[j] = i
+                    heapq.heappush(frontier, (d + length, j))
+        return dist, parent, order
+
+    def bounds_from(self, a):
+        """Lower bounds on the distance from node number a to every node."""
+        t = self.table
+        with np.errstate(invalid='ignore'):
+            bounds = t[0] - t[0][:, a:a + 1]
+            bounds = np.fmax(bounds, t[-1][:, a:a + 1] - t[-1]) if len(t) > 1 else np.abs(bounds)
+        return np.nan_to_num(np.fmax(bounds.max(axis=0), 0), posinf=np.inf)
+
+    def bound(self, a, b):
+        """A lower bound on the distance from node a to node b."""
+        i, j = self.index[a], self.index[b]
+        t = self.table
+        with np.errstate(invalid='ignore'):
+            if len(t) > 1:
+                d = np.fmax(t[0][:, j] - t[0][:, i], t[1][:, i] - t[1][:, j])
+            else:
+                d = np.abs(t[0][:, j] - t[0][:, i])
+        return max(np.nanmax(d, initial=0).item(), 0)
+
+    def save(self, file):
+        """Write the table to file as a .npy array."""
+        np.save(file, self.table)
+
+    def load(self, file):
+        """Read the table from file, memory-mapped read-only."""
+        self.table = np.load(file, mmap_mode='r')
+        assert self.table.shape[-1] == len(self.names)
+        return self
+
+
+# ______________________________________________________________________________
+# Contraction hierarchies for answering many route queries on one graph
+
+
+class ContractionHierarchy:
+    """Preprocess a graph (a Graph or CSRGraph with numeric lengths) once so
+    that shortest-path queries between any two nodes are fast. Nodes are
+    contracted one at a time, least important first (by edge difference:
+    the shortcuts contracting a node would add, less the links it removes,
+    plus how many of its neighbors are already contracted). When a node v
+    is contracted, a shortcut u -> w is added for each pair of links u -> v
+    -> w unless a witness search finds a path from u to w no longer than it
+    that avoids v. A query then needs only a Dijkstra search upward (toward
+    later-contracted nodes) from each end; the best meeting node gives the
+    distance, and shortcuts are unpacked to recover the route.
+    distance(A, B) and route(A, B) are answered from an LRU cache holding up
+    to cache_size (origin, destination) pairs; distance_matrix answers a
+    whole many-to-many table at once; and search(problem) solves a
+    GraphProblem like astar_search does.
+    >>> ch = ContractionHierarchy(romania_map)
+    >>> node = ch.search(GraphProblem('Arad', 'Bucharest', romania_map))
+    >>> node.path_cost, node.solution()
+    (418, ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest'])
+    >>> ch.distance_matrix(['Arad', 'Zerind'], ['Bucharest', 'Oradea', 'Arad']).tolist()
+    [[418.0, 146.0, 0.0], [493.0, 71.0, 75.0]]
+    """
+
+    def __init__(self, graph, cache_size=100_000, settle_limit=50):
+        out = {a: {} for a in graph.nodes()}
+        into = {a: {} for a in graph.nodes()}
+        for a, links in graph.graph_dict.items():
+            for b, d in links.items():
+                if a != b:
+                    out[a][b] = into[b][a] = d
+        self.settle_limit = settle_limit
+        self.up = {}  # up[v] = {w: distance} for links v -> w to later-contracted nodes
+        self.down = {}  # down[v] = {u: distance} for links u -> v from later-contracted nodes
+        self.middle = {}  # middle[u, w] = v for the shortcut u -> w that bypasses v
+        self.rank = {}
+        self.contract(out, into)
+        self.query = memoize(self.query, maxsize=cache_size)
+
+    def contract(self, out, into):
+        """Contract every node, building up, down, middle and rank."""
+        deleted = dict.fromkeys(out, 0)
+
+        def priority(v):
+            return len(self.shortcuts(v, out, into)) - len(out[v]) - len(into[v]) + deleted[v]
+
+        heap = [(priority(v), i, v) for i, v in enumerate(out)]
+        heapq.heapify(heap)
+        while heap:
+            p, i, v = heapq.heappop(heap)
+            if heap:
+                p = priority(v)  # lazy update: priorities only drift upward
+                if p > heap[0][0]:
+                    heapq.heappush(heap, (p, i, v))
+                    continue
+            for u, w, d in self.shortcuts(v, out, into):
+                if d < out[u].get(w, np.inf):
+                    out[u][w] = into[w][u] = d
+                    self.middle[u, w] = v
+            self.up[v], self.down[v] = out.pop(v), into.pop(v)
+            for w in self.up[v]:
+                del into[w][v]
+                deleted[w] += 1
+            for u in self.down[v]:
+                del out[u][v]
+                deleted[u] += 1
+            self.rank[v] = len(self.rank)
+
+    def shortcuts(self, v, out, into):
+        """The (u, w, distance) shortcuts needed if v were contracted now."""
+        needed = []
+        for u, du in into[v].items():
+            targets = {w: du + dw for w, dw in out[v].items() if w != u}
+            if targets:
+                dist = self.witness_search(u, v, max(targets.values()), out)
+                needed.extend((u, w, d) for w, d in targets.items() if dist.get(w, np.inf) > d)
+        return needed
+
+    def witness_search(self, source, avoid, limit, out):
+        """Distances from source that avoid the node avoid, found by a Dijkstra
+        search that stops beyond limit or after settle_limit nodes."""
+        dist = {source: 0}
+        frontier = [(0, 0, source)]
+        settled = 0
+        while frontier and settled < self.settle_limit:
+            d, _, x = heapq.heappop(frontier)
+            if d > limit:
+                break
+            if d > dist[x]:
+                continue
+            settled += 1
+            for y, length in out[x].items():
+                if y != avoid and d + length < dist.get(y, np.inf):
+                    dist[y] = d + length
+                    heapq.heappush(frontier, (d + length, id(y), y))
+        return dist
+
+    def upward_search(self, source, links):
+        """Dijkstra's algorithm over links (self.up or self.down) from source.
+        Returns the distance and parent of each node reached."""
+        dist, parent = {source: 0}, {source: None}
+        frontier = [(0, 0, source)]
+        while frontier:
+            d, _, x = heapq.heappop(frontier)
+            if d > dist[x]:
+                continue
+            for y, length in links[x].items():
+                if d + length < dist.get(y, np.inf):
+                    dist[y], parent[y] = d + length, x
+                    heapq.heappush(frontier, (d + length, id(y), y))
+        return dist, parent
+
+    def query(self, A, B):
+        """Return (distance, route) for the shortest path from A to B, where
+        route is a tuple of nodes; or (np.inf, None) if there is none."""
+        forward, forward_parent = self.upward_search(A, self.up)
+        backward, backward_parent = self.upward_search(B, self.down)
+        best, meet = np.inf, None
+        for v, d in forward.items():
+            if v in backward and d + backward[v] < best:
+                best, meet = d + backward[v], v
+        if meet is None:
+            return np.inf, None
+        nodes, v = [], meet
+        while v is not None:
+            nodes.append(v)
+            v = forward_parent[v]
+        nodes.reverse()
+        v = backward_parent[meet]
+        while v is not None:
+            nodes.append(v)
+            v = backward_parent[v]
+        route = [A]
+        for u, w in zip(nodes, nodes[1:]):
+            route.extend(self.unpack(u, w))
+        return best, tuple(route)
+
+    def unpack(self, u, w):
+        """The nodes after u on the original path that the link u -> w stands for."""
+        path, stack = [], [(u, w)]
+        while stack:
+            u, w = stack.pop()
+            v = self.middle.get((u, w))
+            if v is None:
+                path.append(w)
+            else:
+                stack.extend([(v, w), (u, v)])
+        return path
+
+    def distance(self, A, B):
+        """The length of the shortest path from A to B (np.inf if none)."""
+        return self.query(A, B)[0]
+
+    def route(self, A, B):
+        """The list of nodes on a shortest path from A to B, or None."""
+        route = self.query(A, B)[1]
+        return route and list(route)
+
+    def distance_matrix(self, origins, destinations):
+        """A numpy array whose [i, j] entry is the distance from origins[i] to
+        destinations[j]. Each node reached upward from a destination keeps a
+        bucket of (j, distance) entries, so every search is run only once."""
+        buckets = {}
+        for j, B in enumerate(destinations):
+            for v, d in self.upward_search(B, self.down)[0].items():
+                buckets.setdefault(v, []).append((j, d))
+        matrix = np.full((len(origins), len(destinations)), np.inf)
+        for i, A in enumerate(origins):
+            row = matrix[i]
+            for v, d in self.upward_search(A, self.up)[0].items():
+                for j, d2 in buckets.get(v, ()):
+                    if d + d2 < row[j]:
+                        row[j] = d + d2
+        return matrix
+
+    def search(self, problem):
+        """Solve a GraphProblem on this graph, returning the goal Node."""
+        route = self.route(problem.initial, problem.goal)
+        if route is None:
+            return None
+        node = Node(route[0])
+        for state in route[1:]:
+            node = node.child_node(problem, state)
+        return node
+
+
 # ______________________________________________________________________________
 
 
@@ -1239,14 +2840,16 @@ class NQueensProblem(Problem):
     each other. A state is represented as an N-element array, where
     a value of r in the c-th entry means there is a queen at column c,
     row r, and a value of -1 means that the c-th column has not been
-    filled in yet. We fill in columns left to right.
+    filled in yet. We fill in columns left to right. With hashing=True,
+    graph searches key states on an incrementally updated Zobrist hash.
     >>> depth_first_tree_search(NQueensProblem(8))
     <Node (7, 3, 0, 2, 5, 1, 6, 4)>
     """
 
-    def __init__(self, N):
+    def __init__(self, N, hashing=False):
         super().__init__(tuple([-1] * N))
         self.N = N
+        self.zobrist = ZobristTable(N, range(-1, N)) if hashing else None
 
     def actions(self, state):
         """In the leftmost empty column, try all non-conflicting rows."""
@@ -1264,6 +2867,16 @@ class NQueensProblem(Problem):
         new[col] = row
         return tuple(new)
 
+    def key(self, state):
+        """The Zobrist hash of the state if hashing, else the state itself."""
+        return self.zobrist.hash(state) if self.zobrist else state
+
+    def result_key(self, key, state, row, next_state):
+        """Update the key for a queen placed in the leftmost empty column."""
+        if not self.zobrist:
+            return next_state
+        return self.zobrist.update(key, state.index(-1), -1, row)
+
     def conflicted(self, state, row, col):
         """Would placing a queen at (row, col) conflict with anything?"""
         return any(self.conflict(row, col, state[c], c)
@@ -1283,6 +2896,14 @@ class NQueensProblem(Problem):
         return not any(self.conflicted(state, state[col], col)
                        for col in range(len(state)))
 
+    def encode(self, state):
+        """Pack a state into bytes, one per column (0 for an empty column)."""
+        return bytes(row + 1 for row in state)
+
+    def decode(self, record):
+        """Unpack a state packed by encode."""
+        return tuple(byte - 1 for byte in record)
+
     def h(self, node):
         """Return number of conflicting queens for a given node"""
         num_conflicts = 0
@@ -1337,11 +2958,10 @@ def print_boggle(board):
     print()
 
 
-def boggle_neighbors(n2, cache={}):
+@functools.lru_cache(maxsize=None)
+def boggle_neighbors(n2):
     """Return a list of lists, where the i-th element is the list of indexes
-    for the neighbors of square i."""
-    if cache.get(n2):
-        return cache.get(n2)
+    for the neighbors of square i. Results are cached for each board size."""
     n = exact_sqrt(n2)
     neighbors = [None] * n2
     for i in range(n2):
@@ -1366,7 +2986,6 @@ def boggle_neighbors(n2, cache={}):
             neighbors[i].append(i - 1)
         if not on_right:
             neighbors[i].append(i + 1)
-    cache[n2] = neighbors
     return neighbors
 
 
@@ -1416,17 +3035,58 @@ class Wordlist:
         return len(self.words)
 
 
+class WordTrie:
+    """The words of a Wordlist compiled into a trie. Trie nodes are numbered,
+    the root being 0; children[node] maps a letter to a child node, and
+    words[node] is the word that ends at node, or None."""
+
+    def __init__(self, words):
+        self.children = [{}]
+        self.words = [None]
+        for word in words:
+            node = 0
+            for c in word:
+                child = self.children[node].get(c)
+                if child is None:
+                    child = len(self.children)
+                    self.children[node][c] = child
+                    self.children.append({})
+                    self.words.append(None)
+                node = child
+            self.words[node] = word
+
+    def step(self, node, letters):
+        """The node reached by following letters down from node, or None if
+        no word continues that way."""
+        for c in letters:
+            node = self.children[node].get(c)
+            if node is None:
+                return None
+        return node
+
+
 # _____________________________________________________________________________
 
 
 class BoggleFinder:
-    """A class that allows you to find all the words in a Boggle board."""
+    """A class that allows you to find all the words in a Boggle board.
+    On a 2x2 board every square neighbors the others, so words that use all
+    four squares end in a square with no unvisited neighbor:
+    >>> import io
+    >>> class TinyBoggleFinder(BoggleFinder):
+    ...     wordlist = Wordlist(io.StringIO('act cats scat tact'))
+    >>> sorted(TinyBoggleFinder(list('CATS')).words())
+    ['ACT', 'CATS', 'SCAT']
+    """
 
     wordlist = None  # A class variable, holding a wordlist
+    trie = None  # A class variable, holding the wordlist compiled into a WordTrie
 
     def __init__(self, board=None):
-        if BoggleFinder.wordlist is None:
+        if self.wordlist is None:
             BoggleFinder.wordlist = Wordlist(open_data("EN-text/wordlist.txt"))
+        if self.trie is None:
+            type(self).trie = WordTrie(self.wordlist.words)
         self.found = {}
         if board:
             self.set_board(board)
@@ -1437,30 +3097,35 @@ class BoggleFinder:
             board = random_boggle()
         self.board = board
         self.neighbors = boggle_neighbors(len(board))
+        self.letters = ['QU' if c == 'Q' else c for c in board]
         self.found = {}
         for i in range(len(board)):
-            lo, hi = self.wordlist.bounds[board[i]]
-            self.find(lo, hi, i, [], '')
+            self.find(i)
         return self
 
-    def find(self, lo, hi, i, visited, prefix):
-        """Looking in square i, find the words that continue the prefix,
-        considering the entries in self.wordlist.words[lo:hi], and not
-        revisiting the squares in visited."""
-        if i in visited:
+    def find(self, i):
+        """Find the words that start in square i. The paths being followed are
+        kept on an explicit stack as (square, trie node, visited) triples, where
+        visited is a bitmask with bit j set if square j is on the path."""
+        letters, words = self.letters, self.trie.words
+        node = self.trie.step(0, letters[i])
+        if node is None:
             return
-        wordpos, is_word = self.wordlist.lookup(prefix, lo, hi)
-        if wordpos is not None:
-            if is_word:
-                self.found[prefix] = True
-            visited.append(i)
-            c = self.board[i]
-            if c == 'Q':
-                c = 'QU'
-            prefix += c
+        stack = [(i, node, 1 << i)]
+        while stack:
+            i, node, visited = stack.pop()
+            if words[node] is not None:
+                self.found[words[node]] = True
             for j in self.neighbors[i]:
-                self.find(wordpos, hi, j, visited, prefix)
-            visited.pop()
+                if not visited >> j & 1:
+                    child = self.trie.step(node, letters[j])
+                    if child is not None:
+                        stack.append((j, child, visited | 1 << j))
+
+    def solve_many(self, boards):
+        """Find the words in each of boards, reusing the same compiled word
+        list, and return a list with the words found in each."""
+        return [self.set_board(board).words() for board in boards]
 
     def words(self):
         """The words found."""
@@ -1515,21 +3180,69 @@ def mutate_boggle(board):
 
 
 class InstrumentedProblem(Problem):
-    """Delegates to a problem, and keeps statistics."""
+    """Delegates to a problem, and keeps statistics. frontier_peak is the
+    largest frontier reported through frontier_size, or None if the search
+    reports none (only the tree and graph searches do). max_unexpanded_generated
+    is the largest number, at any time, of states generated but not yet
+    expanded. It is not the size of the frontier: a graph search counts the
+    states it generates and then discards as already explored or on the
+    frontier, so the number can be far larger. With track_reexpansions,
+    reexpansions counts the times actions were asked for in a state that
+    had already been expanded, as memory-bounded searches such as
+    sma_star_search must do; that means remembering every state expanded,
+    so it is off (and reexpansions is None) by default.
+    >>> romania = GraphProblem('Arad', 'Bucharest', romania_map)
+    >>> p = InstrumentedProblem(romania, track_reexpansions=True)
+    >>> node = sma_star_search(p, limit=4)
+    >>> p.succs > len(p.expanded), p.reexpansions == p.succs - len(p.expanded)
+    (True, True)
+    >>> p = InstrumentedProblem(romania)
+    >>> node = breadth_first_graph_search(p)
+    >>> p.frontier_peak, p.max_unexpanded_generated
+    (4, 9)
+    """
 
-    def __init__(self, problem):
+    def __init__(self, problem, track_reexpansions=False):
         self.problem = problem
         self.succs = self.goal_tests = self.states = 0
+        self.max_unexpanded_generated = 0
+        self.frontier_peak = None
+        self.reexpansions = 0 if track_reexpansions else None
+        self.expanded = set() if track_reexpansions else None
         self.found = None
 
-    def actions(self, state):
+    def expanding(self, state):
+        """Count an expansion of state (or, for reverse_actions, of
+        ('reverse', state), so as to keep the two directions apart)."""
         self.succs += 1
+        if self.expanded is not None:
+            if state in self.expanded:
+                self.reexpansions += 1
+            else:
+                self.expanded.add(state)
+
+    def actions(self, state):
+        self.expanding(state)
         return self.problem.actions(state)
 
     def result(self, state, action):
         self.states += 1
+        self.max_unexpanded_generated = max(self.max_unexpanded_generated, self.states - self.succs)
         return self.problem.result(state, action)
 
+    def reverse_actions(self, state):
+        self.expanding(('reverse', state))
+        return getattr(self.problem, 'reverse_actions', self.problem.actions)(state)
+
+    def reverse_result(self, state, action):
+        self.states += 1
+        self.max_unexpanded_generated = max(self.max_unexpanded_generated, self.states - self.succs)
+        return getattr(self.problem, 'reverse_result', self.problem.result)(state, action)
+
+    def frontier_size(self, size):
+        if self.frontier_peak is None or size > self.frontier_peak:
+            self.frontier_peak = size
+
     def goal_test(self, state):
         self.goal_tests += 1
         result = self.problem.goal_test(state)
@@ -1540,6 +3253,12 @@ class InstrumentedProblem(Problem):
     def path_cost(self, c, state1, action, state2):
         return self.problem.path_cost(c, state1, action, state2)
 
+    def key(self, state):
+        return self.problem.key(state)
+
+    def result_key(self, key, state, action, next_state):
+        return self.problem.result_key(key, state, action, next_state)
+
     def value(self, state):
         return self.problem.value(state)
 
@@ -1574,3 +3293,100 @@ def compare_graph_searchers():
                                 GraphProblem('Q', 'WA', australia_map)],
                       header=['Searcher', 'romania_map(Arad, Bucharest)',
                               'romania_map(Oradea, Neamt)', 'australia_map'])
+
+
+def benchmark_run(searcher, problem, conn, track_reexpansions=False):
+    """Run searcher on an InstrumentedProblem in this process and send a dict
+    of measurements down conn. Meant to be the target of a child process."""
+    p = InstrumentedProblem(problem, track_reexpansions)
+    start = time.perf_counter()
+    try:
+        node = searcher(p)
+        status = 'solved' if isinstance(node, Node) else 'failed'
+    except Exception as e:
+        node, status = None, 'error: {!r}'.format(e)
+    elapsed = time.perf_counter() - start
+    peak_rss_kb = None
+    if resource is not None:
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':  # reported in bytes rather than kilobytes
+            peak_rss_kb //= 1024
+    conn.send(dict(status=status, seconds=elapsed, peak_rss_kb=peak_rss_kb,
+                   path_cost=getattr(node, 'path_cost', None),
+                   succs=p.succs, goal_tests=p.goal_tests, states=p.states,
+                   frontier_peak=p.frontier_peak,
+                   max_unexpanded_generated=p.max_unexpanded_generated, reexpansions=p.reexpansions,
+                   nodes_per_sec=p.succs / elapsed if elapsed > 0 else None))
+    conn.close()
+
+
+def benchmark_searchers(problems, header=None,
+                        searchers=[breadth_first_graph_search,
+                                   depth_first_graph_search,
+                                   uniform_cost_search,
+                                   astar_search,
+                                   recursive_best_first_search],
+                        processes=None, timeout=None, track_reexpansions=False,
+                        json_file=None, csv_file=None, display=False):
+    """Like compare_searchers, but each (searcher, problem) run happens in a
+    process of its own, up to processes (default: the number of CPUs) at a
+    time, and is killed if it takes more than timeout seconds. Returns a list
+    of records, one per run, holding the wall time, peak resident set size,
+    InstrumentedProblem counts, frontier_peak (None for searches that keep no
+    frontier), max_unexpanded_generated, reexpansions (None unless
+    track_reexpansions, which costs memory for every state expanded) and
+    expanded nodes per second.
+    The records can also be written to json_file and/or csv_file, and printed
+    as a table if display is true. header, if given, is in the same form as
+    for compare_searchers and names the problems."""
+    names = header[1:] if header else [name(p) for p in problems]
+    processes = processes or multiprocessing.cpu_count()
+    jobs = deque((i, s, j) for i, (s, j) in enumerate(
+        (s, j) for s in searchers for j in range(len(problems))))
+    records = [None] * len(jobs)
+    running = {}  # connection -> (job number, process, deadline)
+    while jobs or running:
+        while jobs and len(running) < processes:
+            i, searcher, j = jobs.popleft()
+            records[i] = dict(searcher=name(searcher), problem=names[j])
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=benchmark_run, args=(searcher, problems[j], sender, track_reexpansions))
+            process.start()
+            sender.close()
+            running[receiver] = (i, process, timeout and time.monotonic() + timeout)
+        deadlines = [d for (_, _, d) in running.values() if d]
+        wait = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        for conn in multiprocessing.connection.wait(list(running), wait):
+            i, process, _ = running.pop(conn)
+            try:
+                records[i].update(conn.recv())
+            except EOFError:
+                records[i].update(status='crashed', seconds=None)
+            process.join()
+        for conn, (i, process, deadline) in list(running.items()):
+            if deadline and time.monotonic() >= deadline:
+                process.terminate()
+                process.join()
+                del running[conn]
+                records[i].update(status='timeout', seconds=timeout)
+
+    if json_file:
+        with open(json_file, 'w') as f:
+            json.dump(records, f, indent=2)
+    if csv_file:
+        fields = ['searcher', 'problem', 'status', 'seconds', 'peak_rss_kb', 'path_cost',
+                  'succs', 'goal_tests', 'states', 'frontier_peak', 'max_unexpanded_generated',
+                  'reexpansions', 'nodes_per_sec']
+        with open(csv_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(records)
+    if display:
+        print_table([[r['searcher'], r['problem'], r['status'],
+                      None if r['seconds'] is None else round(r['seconds'], 4),
+                      r.get('peak_rss_kb'), r.get('succs'), r.get('frontier_peak')]
+                     for r in records],
+                    ['Searcher', 'Problem', 'Status', 'Seconds', 'Peak RSS (kB)', 'Expanded',
+                     'Frontier peak'])
+    return records
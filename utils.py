@@ -777,6 +777,111 @@ class PriorityQueue:
         heapq.heapify(self.heap)
 
 
+class IndexedPriorityQueue(PriorityQueue):
+    """A PriorityQueue that also keeps a map from each item to its position in
+    the heap, so membership tests and lookups are O(1) and deletion (and hence
+    decrease-key, as a delete followed by an append) is O(log n).
+    Items must be hashable, and the queue holds at most one entry per item:
+    appending an item that is already queued replaces the old entry.
+    >>> cost = {'a': 5, 'b': 1, 'c': 4, 'd': 2, 'e': 3}
+    >>> q = IndexedPriorityQueue('min', f=lambda x: cost[x])
+    >>> for x in 'abcde': q.append(x)
+    >>> cost['c'] = 0
+    >>> q.append('c')  # decrease-key
+    >>> len(q), q['c'], 'c' in q
+    (5, 0, True)
+    >>> del q['b']
+    >>> len(q), 'b' in q
+    (4, False)
+    >>> [q.pop() for _ in range(len(q))]
+    ['c', 'd', 'e', 'a']
+    """
+
+    def __init__(self, order='min', f=lambda x: x):
+        super().__init__(order, f)
+        self.index = {}
+
+    def append(self, item):
+        """Insert item at its correct position."""
+        if item in self.index:
+            del self[item]
+        self.heap.append((self.f(item), item))
+        self.index[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if not self.heap:
+            raise Exception('Trying to pop from empty PriorityQueue.')
+        item = self.heap[0][1]
+        self._remove(0)
+        return item
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Returns the value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.heap[self.index[key]][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete the entry for key."""
+        try:
+            pos = self.index[key]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        self._remove(pos)
+
+    def _remove(self, pos):
+        """Remove the entry at heap position pos, filling the hole with the
+        last entry and restoring the heap invariant around it."""
+        heap = self.heap
+        del self.index[heap[pos][1]]
+        last = heap.pop()
+        if pos < len(heap):
+            heap[pos] = last
+            self.index[last[1]] = pos
+            self._sift_up(pos)
+            self._sift_down(self.index[last[1]])
+
+    def _sift_up(self, pos):
+        heap, index = self.heap, self.index
+        entry = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[pos] = heap[parent]
+            index[heap[pos][1]] = pos
+            pos = parent
+        heap[pos] = entry
+        index[entry[1]] = pos
+
+    def _sift_down(self, pos):
+        heap, index = self.heap, self.index
+        n = len(heap)
+        entry = heap[pos]
+        while True:
+            child = 2 * pos + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[pos] = heap[child]
+            index[heap[pos][1]] = pos
+            pos = child
+        heap[pos] = entry
+        index[entry[1]] = pos
+
+
 # ______________________________________________________________________________
 # Useful Shorthands
 